@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Memory per block and parse / serialise rate of block_state compared to
+the previous dict based implementation (kept below as legacy_block_state).
+
+usage: python benchmarks/bench_block_state.py --blocks 200000
+"""
+import argparse
+import gc
+import os
+import random
+import time
+import tracemalloc
+from nanolab.xnomin.peers import block_state
+
+
+class legacy_block_state:
+
+    def __init__(self, account, prev, rep, bal, link, sig, work):
+        self.account = account
+        self.previous = prev
+        self.representative = rep
+        self.balance = bal
+        self.link = link
+        self.signature = sig
+        self.work = work
+        self.ancillary = {"next": None, "peers": set(), "type": 0}
+
+    def serialise(self, include_block_type):
+        data = b''
+        if include_block_type:
+            data += (6).to_bytes(1, "big")
+        data += self.account
+        data += self.previous
+        data += self.representative
+        data += self.balance.to_bytes(16, "big")
+        data += self.link
+        data += self.signature
+        data += self.work.to_bytes(8, "big")
+        return data
+
+    @classmethod
+    def parse(cls, data):
+        return cls(data[0:32], data[32:64], data[64:96],
+                   int.from_bytes(data[96:112], "big"), data[112:144],
+                   data[144:208], int.from_bytes(data[208:], "big"))
+
+
+def create_blocks(block_count: int):
+    return [
+        block_state(os.urandom(32), os.urandom(32), os.urandom(32),
+                    random.getrandbits(128), os.urandom(32), os.urandom(64),
+                    random.getrandbits(64)).serialise(False)
+        for _ in range(block_count)
+    ]
+
+
+def bench(name: str, cls, data: list) -> None:
+    gc.collect()
+    start_time = time.perf_counter()
+    blocks = [cls.parse(d) for d in data]
+    parse_s = time.perf_counter() - start_time
+
+    # parse again while tracing, tracemalloc slows down allocations
+    del blocks
+    gc.collect()
+    tracemalloc.start()
+    blocks = [cls.parse(d) for d in data]
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start_time = time.perf_counter()
+    for block in blocks:
+        block.serialise(False)
+    serialise_s = time.perf_counter() - start_time
+
+    print(f"{name:<20} {memory / len(data):8.0f} bytes/block "
+          f"parse {len(data) / parse_s:10.0f} blocks/s "
+          f"serialise {len(data) / serialise_s:10.0f} blocks/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--blocks', type=int, default=200000)
+    args = parser.parse_args()
+
+    data = create_blocks(args.blocks)
+    bench("legacy_block_state", legacy_block_state, data)
+    bench("block_state", block_state, data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Header heavy paths with frozen_message_header compared to the previous
+message_header (kept below as legacy_message_header): publish message
+serialisation, header equality and the inbound parse loop.
+
+usage: python benchmarks/bench_message_header.py --messages 200000
+"""
+import argparse
+import os
+import time
+from nanolab.xnomin.message_stream import message_stream
+from nanolab.xnomin.peers import (message_header, frozen_message_header,
+                                  message_type, message_type_enum,
+                                  network_id, block_type_enum,
+                                  block_length_by_type, confirm_ack_size,
+                                  node_id_handshake_size)
+
+
+class legacy_message_header(message_header):
+
+    def serialise_header(self) -> bytes:
+        header = b""
+        header += ord('R').to_bytes(1, "big")
+        header += ord(str(self.net_id)).to_bytes(1, "big")
+        header += self.ver_max.to_bytes(1, "big")
+        header += self.ver_using.to_bytes(1, "big")
+        header += self.ver_min.to_bytes(1, "big")
+        header += self.msg_type.type.to_bytes(1, "big")
+        header += self.ext.to_bytes(2, "little")
+        return header
+
+    @classmethod
+    def parse_header(cls, data: bytes):
+        hdr = message_header.parse_header(data)
+        return legacy_message_header(hdr.net_id,
+                                     [hdr.ver_max, hdr.ver_using, hdr.ver_min],
+                                     hdr.msg_type, hdr.ext)
+
+    def payload_length_bytes(self):
+        # message_type objects built for every comparison, as before
+        if self.msg_type == message_type(message_type_enum.bulk_pull):
+            return None
+        if self.msg_type == message_type(message_type_enum.bulk_push):
+            return 0
+        elif self.msg_type == message_type(message_type_enum.telemetry_req):
+            return 0
+        elif self.msg_type == message_type(message_type_enum.frontier_req):
+            return 32 + 4 + 4
+        elif self.msg_type == message_type(
+                message_type_enum.bulk_pull_account):
+            return 32 + 16 + 1
+        elif self.msg_type == message_type(message_type_enum.keepalive):
+            return 8 * (16 + 2)
+        elif self.msg_type == message_type(message_type_enum.publish):
+            return block_length_by_type(self.block_type())
+        elif self.msg_type == message_type(message_type_enum.confirm_ack):
+            return confirm_ack_size(self.block_type(), self.confirm_count())
+        elif self.msg_type == message_type(
+                message_type_enum.node_id_handshake):
+            return node_id_handshake_size(self.is_query(), self.is_response())
+        elif self.msg_type == message_type(message_type_enum.telemetry_ack):
+            return self.telemetry_ack_size()
+        return None
+
+    def __eq__(self, other):
+        if str(self) == str(other):
+            return True
+
+
+def publish_header(cls):
+    hdr = cls(network_id(ord('X')), [21, 21, 20],
+              message_type(message_type_enum.publish), 0)
+    hdr.set_block_type(block_type_enum.state)
+    return hdr
+
+
+def inbound_traffic(message_count: int) -> bytes:
+    # mostly votes with a few keepalives, like a node's realtime traffic
+    net_id = network_id(ord('X'))
+    vote = message_header(net_id, [21, 21, 20],
+                          message_type(message_type_enum.confirm_ack), 0)
+    vote.set_block_type(block_type_enum.not_a_block)
+    vote.set_item_count(12)
+    keepalive = message_header(net_id, [21, 21, 20],
+                               message_type(message_type_enum.keepalive), 0)
+    messages = [
+        vote.serialise_header() + os.urandom(vote.payload_length_bytes()),
+        keepalive.serialise_header() + bytes(144)
+    ]
+    return b"".join(messages[i % 10 == 9] for i in range(message_count))
+
+
+def bench(name: str, func, count: int) -> None:
+    start_time = time.perf_counter()
+    func()
+    duration = time.perf_counter() - start_time
+    print(f"{name:<32} {duration:8.3f}s {count / duration:12.0f} /s")
+
+
+def parse_loop(cls, data: bytes) -> int:
+    # framing as done by message_stream, without the buffer handling
+    view = memoryview(data)
+    offset = 0
+    while offset < len(data):
+        hdr = cls.parse_header(bytes(view[offset:offset + 8]))
+        offset += 8 + hdr.payload_length_bytes()
+    return offset
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200000)
+    args = parser.parse_args()
+    count = args.messages
+    block = os.urandom(216)
+
+    headers = {
+        "legacy": [publish_header(legacy_message_header) for _ in range(2)],
+        "mutable": [publish_header(message_header) for _ in range(2)],
+        "frozen": [publish_header(message_header).freeze() for _ in range(2)]
+    }
+    for name, (hdr, other) in headers.items():
+        bench(f"{name} publish serialise",
+              lambda: [hdr.serialise_header() + block for _ in range(count)],
+              count)
+        bench(f"{name} header equality",
+              lambda: [hdr == other for _ in range(count)], count)
+
+    data = inbound_traffic(count)
+    bench("legacy parse loop",
+          lambda: parse_loop(legacy_message_header, data), count)
+    bench("frozen parse loop",
+          lambda: parse_loop(frozen_message_header, data), count)
+    bench("message_stream 64k chunks",
+          lambda: sum(1 for _ in stream_chunks(data)), count)
+
+
+def stream_chunks(data: bytes):
+    stream = message_stream()
+    for offset in range(0, len(data), 65536):
+        yield from stream.feed(data[offset:offset + 65536])
+
+
+if __name__ == "__main__":
+    main()
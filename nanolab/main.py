@@ -15,8 +15,11 @@ def main():
     elif args.command == "list":
         arg_parse.list_testcases()
 
+    elif args.command == "convert":
+        arg_parse.convert_blocks()
+
     else:
-        print("Invalid command. Use 'nanolab run' or 'nanolab list'")
+        print("Invalid command. Use 'nanolab run', 'nanolab list' or 'nanolab convert'")
 
 
 if __name__ == "__main__":
@@ -1,14 +1,31 @@
-from nanolab.xnomin.peers import get_connected_socket_endpoint, message_header, block_state, block_type_enum, message_type_enum, network_id, message_type, get_peers_from_service
-from nanolab.xnomin.handshake import node_handshake_id
+from nanolab.xnomin.peers import message_header, block_state, block_type_enum, message_type_enum, network_id, message_type, get_peers_from_service, message_type_enum_to_str
 from nanomock.modules.nl_parse_config import ConfigReadWrite
 from nanolab.src.utils import get_config_parser
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Dict, List
+from nanolab.src.json_stream import iter_json_array
+from nanolab.src.permutation import IndexPermutation
+from nanolab.publisher.rate_control import LoadProfile, TokenBucketPacer
+from nanolab.publisher.receive_drain import ReceiveDrain
+from nanolab.publisher.publish_completion import PublishCompletion
+from nanolab.publisher.block_corpus import BlockCorpus, is_binary_corpus
+from nanolab.publisher.connection_pool import get_connection_pool
+from nanolab.publisher.handshake_engine import HandshakeEngine
+from nanolab.publisher.publish_metrics import PublishMetrics
+from nanolab.publisher.round_gate import RoundGate
+from nanolab.publisher.vote_observer import VoteObserver
+from nanolab.publisher.block_order import dependency_order, order_block_lists, print_order_report
+from nanolab.publisher.send_log import SendLog, IndexedMessages, ConfirmationTracker, confirmation_latency
+from nanolab.publisher.confirmation_stats import ConfirmationStatsPrinter, ConfirmationTableFormatter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+from array import array
+from collections.abc import Sequence
 import asyncio
 import random
 import time
 import itertools
-import threading
+import multiprocessing
+import sys
+import zlib
 
 
 from nanolab.loggers.logger_manager import LoggingManager
@@ -20,16 +37,176 @@ async def start_loggers(logger_params: Dict, sink_params: List[Dict]):
 
 
 async def xnolib_publish(params: dict):
+    tracker = None
+    # observe_votes measures latency from the votes instead of RPC polling
+    if params.get("send_log_path") and not params.get("observe_votes"):
+        # confirmations are polled while publishing for end to end latency
+        tracker = ConfirmationTracker(params)
+        await tracker.start(select_hashes(params))
+
+    if int(params.get("processes", 1)) > 1:
+        results = await xnolib_publish_processes(params)
+        send_log_paths = [r["send_log_path"] for r in results]
+    else:
+        results = await xnolib_publish_shard(params, tracker)
+        send_log_paths = [results["send_log_path"]] if tracker else []
+
+    if tracker:
+        await tracker.finish()
+        tracker.save(f"{params['send_log_path']}.confirmations.json")
+        print_confirmation_latency(send_log_paths, tracker.confirmed_at)
+    return results
+
+
+def select_hashes(params: dict):
+    return itertools.chain.from_iterable(stream_blocks_from_disk(params, "h"))
+
+
+def print_confirmation_latency(send_log_paths: List[str],
+                               confirmed_at: Dict[str, int]) -> dict:
+    stats = confirmation_latency(
+        [SendLog.load(path) for path in send_log_paths], confirmed_at)
+    ConfirmationStatsPrinter().print_stats(stats,
+                                           ConfirmationTableFormatter())
+    return stats
+
+
+async def xnolib_publish_shard(params: dict,
+                               tracker: ConfirmationTracker = None):
+    # a tracker of this process polls only what this shard has sent
+
+    # round_gated publishing needs the rounds, which streaming keeps
+    if params.get("stream", False) or params.get("round_gated", False):
+        sp = SocketPublish(params)
+        if params.get("dependency_order", False):
+            hashes = []
+            if sp.vote_observer:
+                sp.vote_observer.start(select_hashes(params))
+            rounds = stream_ordered_rounds(params, hashes)
+        elif sp.vote_observer:
+            # votes are matched against the hashes from the first message on
+            hashes = list(select_hashes(params))
+            sp.vote_observer.start(hashes)
+            rounds = stream_blocks_from_disk(params)
+        elif sp.send_log:
+            hashes = []
+            rounds = stream_blocks_collect_hashes(params, hashes)
+        else:
+            hashes = []
+            rounds = stream_blocks_from_disk(params)
+        if tracker:
+            tracker.follow(sp.send_log, hashes)
+        await sp.run_stream(rounds)
+        sp.save_send_log(hashes)
+        sp.report_votes()
+        return sp.get_throughput_stats()
 
     block_lists = get_blocks_from_disk(params)
+    if params.get("dependency_order", False):
+        block_lists = order_block_lists(block_lists)
+    if "message_range" in params:
+        block_lists = get_message_range(block_lists, *params["message_range"])
     sp = SocketPublish(params)
-    messages, _ = sp.flatten_messages(block_lists)
+    messages, block_hashes = sp.flatten_messages(block_lists,
+                                                 serialised=sp.preserialise)
+    if sp.vote_observer:
+        sp.vote_observer.start(block_hashes)
+    if tracker:
+        tracker.follow(sp.send_log, block_hashes)
     sp_task = asyncio.create_task(sp.run(messages))
     await asyncio.gather(sp_task)
+    sp.save_send_log(block_hashes)
+    sp.report_votes()
+    return sp.get_throughput_stats()
+
+
+def publish_shard(params: dict):
+    # entry point of a publisher worker process
+    return asyncio.run(xnolib_publish_shard(params))
+
+
+async def xnolib_publish_processes(params: dict):
+    if params.get("round_gated", False):
+        raise ValueError("round_gated publishing requires processes=1")
+    if params.get("observe_votes", False):
+        raise ValueError("observe_votes requires processes=1")
+    shards = create_publish_shards(params)
+    loop = asyncio.get_running_loop()
+    # spawn: the parent may run logger threads next to the publisher
+    with ProcessPoolExecutor(
+            max_workers=len(shards),
+            mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, publish_shard, shard)
+            for shard in shards
+        ])
+    print_worker_stats(results)
+    return results
+
+
+def create_publish_shards(params: dict) -> List[dict]:
+    peers = list(
+        SocketPublish.get_xnolib_context(peers=params.get("peers"))["peers"])
+    by_account = params.get("split_by_account", False)
+    split = (params.get("split", False)
+             or params.get("split_skip", False)) and not by_account
+    if params.get("split_skip", False):
+        peers = peers[1:]
+    if not peers:
+        raise ValueError("No peers available to publish to")
+
+    processes = min(int(params["processes"]), len(peers))
+    # contiguous peer slices, so every peer gets the same messages (split)
+    # or account slot as in a single process
+    peer_bounds = [
+        peer * len(peers) // processes for peer in range(processes + 1)
+    ]
+    if split:
+        # counted from the hashes, the blocks are neither loaded nor decoded
+        message_count = sum(len(x) for x in stream_blocks_from_disk(params, "h"))
+        per_peer, remainder = divmod(message_count, len(peers))
+
+    shards = []
+    for worker in range(processes):
+        first, last = peer_bounds[worker], peer_bounds[worker + 1]
+        shard_peers = peers[first:last]
+        shard = {
+            **params, "peers": shard_peers,
+            "processes": 1,
+            "worker": worker
+        }
+        if by_account:
+            # accounts are hashed over the peers of all workers
+            shard.update(split_skip=False,
+                         account_slots=list(range(first, last)),
+                         account_slot_count=len(peers))
+        elif split:
+            # each worker publishes the range that belongs to its peers,
+            # bounds as in create_split_tasks
+            start = first * per_peer + min(first, remainder)
+            end = last * per_peer + min(last, remainder)
+            shard.update(split=True, split_skip=False, message_range=[start, end])
+        if params.get("send_log_path"):
+            shard["send_log_path"] = f"{params['send_log_path']}.{worker}"
+        shards.append(shard)
+    return shards
+
+
+def print_worker_stats(results: List[dict]) -> None:
+    for worker, stats in enumerate(results):
+        print(f"worker {worker} peers: {len(stats['peers'])} "
+              f"sent_messages: {stats['sent_messages']} "
+              f"duration_s: {stats['duration_s']:.2f} "
+              f"bps: {stats['bps']:.0f}")
+    print(f"total sent_messages: {sum(r['sent_messages'] for r in results)} "
+          f"bps: {sum(r['bps'] for r in results):.0f}")
 
 
 def read_blocks_from_disk(path, seeds=False, hashes=False, blocks=False):
-    res = ConfigReadWrite().read_json(path)
+    if is_binary_corpus(path):
+        res = BlockCorpus(path).to_dict()
+    else:
+        res = ConfigReadWrite().read_json(path)
     if seeds:
         return res["s"]
     if hashes:
@@ -83,29 +260,244 @@ def get_blocks_from_disk(params: dict):
     return blocks
 
 
+def iter_corpus_rounds(blocks_path: str, keys: Tuple[str, ...],
+                       selected: range):
+    # yields a tuple with the lists of `keys` ("h", "b") of every round,
+    # rounds outside `selected` may come without their hashes
+    if is_binary_corpus(blocks_path):
+        corpus = BlockCorpus(blocks_path)
+        readers = [
+            corpus.round_hashes if key == "h" else corpus.round_blocks
+            for key in keys
+        ]
+        for round_index in range(corpus.round_count):
+            yield tuple(read(round_index) for read in readers)
+        return
+    if keys != ("h", "b"):
+        yield from zip(*(iter_json_array(blocks_path, key) for key in keys))
+        return
+    # the hashes precede the blocks in the json, the selected rounds' are
+    # kept on the way so both come from a single pass over the file
+    hash_rounds = []
+
+    def collect_hashes(hash_list: List[str]) -> None:
+        hash_rounds.append(
+            hash_list if len(hash_rounds) in selected else None)
+
+    block_rounds = iter_json_array(blocks_path, "b", {"h": collect_hashes})
+    for round_index, block_list in enumerate(block_rounds):
+        if round_index >= len(hash_rounds):
+            # hashes stored after the blocks, read them in a second stream
+            hash_stream = itertools.islice(
+                iter_json_array(blocks_path, "h"), round_index, None)
+            yield from zip(hash_stream,
+                           itertools.chain([block_list], block_rounds))
+            return
+        yield hash_rounds[round_index], block_list
+        hash_rounds[round_index] = None
+
+
+def stream_rounds_from_disk(params: dict, keys: Tuple[str, ...] = ("b", )):
+    # yields a tuple with the selected lists of `keys` round by round
+    # without loading the corpus
+    # mandatory params: blocks_path
+    # optional params: start_round, end_round, subset, message_range
+    start_round = int(params.get("start_round", 0))
+    end_round = params.get("end_round")
+    subset = params.get("subset", {})
+    start_index = int(subset.get("start_index", 0))
+    end_index = subset.get("end_index")
+    end_index = int(end_index) if end_index is not None else None
+    message_range = params.get("message_range")
+
+    offset = 0
+    selected = range(start_round,
+                     int(end_round) if end_round is not None else sys.maxsize)
+    rounds = iter_corpus_rounds(params["blocks_path"], keys, selected)
+    for round_index, round_lists in enumerate(rounds):
+        if round_index >= selected.stop:
+            break
+        if round_index < selected.start:
+            continue
+        round_lists = [r[start_index:end_index] for r in round_lists]
+        if message_range:
+            start, end = message_range
+            range_start = max(start - offset, 0)
+            range_end = max(end - offset, 0)
+            offset += len(round_lists[0])
+            round_lists = [r[range_start:range_end] for r in round_lists]
+        if round_lists[0]:
+            yield tuple(round_lists)
+
+
+def stream_blocks_from_disk(params: dict, key: str = "b"):
+    # yields the selected blocks (or hashes for key "h") round by round
+    for round_lists in stream_rounds_from_disk(params, (key, )):
+        yield round_lists[0]
+
+
+def stream_blocks_collect_hashes(params: dict, hashes: list):
+    # yields the selected blocks round by round, their hashes are appended
+    # to hashes in the same pass over the corpus
+    for hash_list, block_list in stream_rounds_from_disk(params, ("h", "b")):
+        hashes.extend(hash_list)
+        yield block_list
+
+
+def stream_ordered_rounds(params: dict, hashes: list):
+    # dependency orders every round on its own, the hashes of the
+    # published order are appended to hashes
+    for hash_list, block_list in stream_rounds_from_disk(params, ("h", "b")):
+        order, report = dependency_order(hash_list, block_list)
+        if report["out_of_order"]:
+            print_order_report(report)
+        hashes.extend(hash_list[pos] for pos in order)
+        yield [block_list[pos] for pos in order]
+
+
+def get_message_range(block_lists: dict, start: int, end: int):
+    # flattens the rounds and keeps the messages [start, end)
+    return {
+        'b': [list(itertools.chain(*block_lists['b']))[start:end]],
+        'h': [list(itertools.chain(*block_lists['h']))[start:end]]
+    }
+
+
+class SerialisedMessages(Sequence):
+    """Read-only sequence of pre-serialised messages in one contiguous buffer.
+
+    Records are located through an offset index and returned as memoryview
+    slices, so sending never re-serialises or copies a message. Slicing and
+    reversing only create a new view on the same buffer.
+    """
+
+    def __init__(self, buffer, offsets: array, order: range = None):
+        self.buffer = memoryview(buffer)
+        self.offsets = offsets
+        self.order = order if order is not None else range(len(offsets) - 1)
+
+    @classmethod
+    def from_blocks(cls, header: bytes, blocks):
+        return cls.from_serialised_blocks(
+            header, (block.serialise(False) for block in blocks))
+
+    @classmethod
+    def from_serialised_blocks(cls, header: bytes, blocks):
+        buffer = bytearray()
+        offsets = array('Q', [0])
+        for block in blocks:
+            buffer += header
+            buffer += block
+            offsets.append(len(buffer))
+        return cls(buffer, offsets)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return SerialisedMessages(self.buffer, self.offsets,
+                                      self.order[idx])
+        pos = self.order[idx]
+        return self.buffer[self.offsets[pos]:self.offsets[pos + 1]]
+
+    def __iter__(self):
+        for pos in self.order:
+            yield self.buffer[self.offsets[pos]:self.offsets[pos + 1]]
+
+    def reverse(self):
+        self.order = self.order[::-1]
+
+
+class MessageSubset(Sequence):
+    """Messages at the given positions of another message sequence."""
+
+    def __init__(self, messages, positions: array):
+        self.messages = messages
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return MessageSubset(self.messages, self.positions[idx])
+        return self.messages[self.positions[idx]]
+
+    def reverse(self):
+        self.positions = self.positions[::-1]
+
+
 class SocketPublish:
 
+    IOV_MAX = 1024
+
     def __init__(self, params: Dict[str, Any]):
         self.bps = float(params["bps"])
+        self.load_profile = params.get("load_profile", [])
+        # max messages coalesced into one sendmsg call per pacing tick
+        self.batch_size = min(int(params.get("batch_size", 1)), self.IOV_MAX)
+        self.batch_stats = {}
+        self.pacers = {}
+        self.sent_messages = 0
+        self.publish_duration = 0
+        self.drain = None
+        self.completion = PublishCompletion(params)
         self.peers = params.get("peers")
         self.split = params.get("split", False)
         # skips 1st socket (genesis)
         self.split_skip = params.get("split_skip", False)
         self.reverse = params.get("reverse", False)
+        # keeps every account chain on one socket, in order
+        self.split_by_account = params.get("split_by_account", False)
+        # global socket slots of this worker when sharded over processes
+        self.account_slots = params.get("account_slots")
+        self.account_slot_count = params.get("account_slot_count")
         self.shuffle = params.get("shuffle", False)
-        self.sockets, self.hdr = self.__set_sockets_handshake()
-
-    def handshake_peer(self, peeraddr, peerport, ctx):
-        try:
-            print('Connecting to [%s]:%s' % (peeraddr, peerport))
-            s = get_connected_socket_endpoint(peeraddr, peerport)
-            signing_key, verifying_key = node_handshake_id.keypair()
-            node_handshake_id.perform_handshake_exchange(
-                ctx, s, signing_key, verifying_key)
-            return s
-        except Exception as e:
-            print(str(e))
-            pass
+        self.shuffle_seed = params.get("shuffle_seed")
+        if self.shuffle and self.shuffle_seed is None:
+            self.shuffle_seed = random.getrandbits(32)
+            print(f"shuffle_seed: {self.shuffle_seed}")
+        self.preserialise = params.get("preserialise", True)
+        # asyncio: non-blocking sends, blocking: legacy socket.sendall
+        self.transport = params.get("transport", "asyncio")
+        if self.transport not in ("asyncio", "blocking"):
+            raise ValueError(f"Invalid transport: {self.transport}")
+        # reuse handshaked connections of earlier publish commands
+        self.pool = get_connection_pool() if params.get(
+            "reuse_connections", True) else None
+        self.received_at_start = {}
+        # frame what the nodes send back and count it per message type
+        self.parse_inbound = params.get("parse_inbound", False)
+        self.inbound_messages = {}
+        # realtime connections per peer, the peer's messages are spread
+        # round-robin across them
+        self.channels_per_peer = int(params.get("channels_per_peer", 1))
+        if self.channels_per_peer < 1:
+            raise ValueError(
+                f"Invalid channels_per_peer: {self.channels_per_peer}")
+        self.channel_stats = {}
+        # wait for every round to be cemented before sending the next
+        self.round_gate = RoundGate(params) if params.get(
+            "round_gated", False) else None
+        self.metrics = PublishMetrics(float(params.get("metrics_interval_s", 1)))
+        # (hash index, peer, send time) of every sent message
+        self.send_log_path = params.get("send_log_path")
+        self.send_log = SendLog() if self.send_log_path else None
+        # first vote / quorum time per block from the nodes' confirm_acks
+        self.vote_observer = None
+        self.vote_stats = {}
+        if params.get("observe_votes", False):
+            if not self.send_log_path:
+                raise ValueError("observe_votes requires send_log_path")
+            self.vote_observer = VoteObserver(params)
+        # inbound traffic is framed only when something consumes the messages
+        self.frame_inbound = self.parse_inbound or bool(self.vote_observer)
+        self.ctx = self.get_xnolib_context(peers=self.peers)
+        self.hdr = self.create_publish_header(self.ctx)
+        self.handshake_engine = HandshakeEngine(self.ctx, params)
+        # connected by start_publishing
+        self.sockets = []
 
     class msg_publish:
 
@@ -122,7 +514,8 @@ class SocketPublish:
         def __str__(self):
             return str(self.hdr) + "\n" + str(self.block)
 
-    def get_xnolib_context(self, peers=None):
+    @staticmethod
+    def get_xnolib_context(peers=None):
         conf_p = get_config_parser()
         ctx = conf_p.get_xnolib_localctx()
         if  conf_p.get_env() == 'beta' :
@@ -139,83 +532,298 @@ class SocketPublish:
                     ctx["peers"].pop(peer, None)
         return ctx
 
-    def __set_sockets_handshake(self):
-        ctx = self.get_xnolib_context(peers=self.peers)
-
+    @staticmethod
+    def create_publish_header(ctx: dict) -> message_header:
         msgtype = message_type_enum.publish
         hdr = message_header(ctx['net_id'], [21, 21, 20],
-                            message_type(msgtype), 0)
+                             message_type(msgtype), 0)
         hdr.set_block_type(block_type_enum.state)
-        all_peers = get_peers_from_service(ctx)
+        # shared by every publish message, serialised once
+        return hdr.freeze()
+
+    async def connect_peers(self) -> List[Dict[str, Any]]:
+        all_peers = get_peers_from_service(self.ctx)
         sockets = []
+        endpoints = []
+        for peer in all_peers:
+            key = (f"{peer.ip}:{peer.port}", self.ctx['net_id'].id,
+                   self.frame_inbound)
+            for channel in range(self.channels_per_peer):
+                socket_info = self.pool.acquire(key) if self.pool else None
+                if socket_info is not None:
+                    socket_info['channel'] = channel
+                    sockets.append(socket_info)
+                else:
+                    endpoints.append((str(peer.ip), peer.port, key, channel))
+        if not endpoints:
+            return sockets
 
-        def handshake_peer_wrapper(peer):
-            s = self.handshake_peer(str(peer.ip), peer.port, ctx)
-            if s is not None:
-                return {
-                    "socket": s,
-                    "peer": f"{peer.ip}:{peer.port}"
-                }
-            return None
+        start_time = time.perf_counter()
+        connected = await self.handshake_engine.connect_all(
+            [(addr, port) for addr, port, _, _ in endpoints])
+        self.handshake_engine.print_report(time.perf_counter() - start_time)
+        for (addr, port, key, channel), s in zip(endpoints, connected):
+            if s is None:
+                continue
+            socket_info = {
+                "socket": s,
+                "peer": f"{addr}:{port}",
+                "key": key,
+                "channel": channel,
+                "frame_messages": self.frame_inbound
+            }
+            if self.pool:
+                self.pool.track(socket_info)
+            sockets.append(socket_info)
+        return sockets
 
-        # Adjust max_workers according to your needs
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            futures = {executor.submit(handshake_peer_wrapper, peer): peer for peer in all_peers}
-            for future in as_completed(futures):
-                result = future.result()
-                if result is not None:
-                    sockets.append(result)
+    def peer_sockets(self) -> List[Dict[str, Any]]:
+        # first channel of every peer, publish() fans out to the others
+        peers = {}
+        for socket_info in self.sockets:
+            peers.setdefault(socket_info['peer'], socket_info)
+        return list(peers.values())
 
-        return sockets, hdr
+    def peer_channels(self, socket: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [s for s in self.sockets if s['peer'] == socket['peer']]
+
+    @staticmethod
+    def channel_name(socket: Dict[str, Any]) -> str:
+        return f"{socket['peer']}#{socket.get('channel', 0)}"
+
+    def count_sent(self, socket: Dict[str, Any], messages: int,
+                   sent_bytes: int, start_ns: int, end_ns: int) -> None:
+        self.sent_messages += messages
+        self.metrics.record_send(socket['peer'], start_ns, end_ns, messages,
+                                 sent_bytes)
+        stats = self.channel_stats.setdefault(self.channel_name(socket),
+                                              [0, 0])
+        stats[0] += messages
+        stats[1] += sent_bytes
+
+    def log_sent(self, socket: Dict[str, Any], messages,
+                 send_ns: int) -> None:
+        if self.send_log is None:
+            return
+        for index, _ in messages:
+            self.send_log.record(index, socket['peer'], send_ns)
+
+    def report_votes(self) -> None:
+        # joins the saved send log with the observed vote times
+        if self.vote_observer is None:
+            return
+        self.vote_stats = self.vote_observer.to_dict()
+        print(f"votes: {self.vote_stats['votes']} blocks: "
+              f"{self.vote_stats['blocks']} first_vote: "
+              f"{self.vote_stats['first_vote']} quorum: "
+              f"{self.vote_stats['quorum']}")
+        print("latency to first vote")
+        self.vote_stats["first_vote_latency"] = print_confirmation_latency(
+            [self.send_log_path], self.vote_observer.voted_at())
+        if self.vote_observer.weights:
+            print("latency to quorum")
+            self.vote_stats["quorum_latency"] = print_confirmation_latency(
+                [self.send_log_path], self.vote_observer.voted_at(quorum=True))
+
+    def save_send_log(self, hashes) -> None:
+        if self.send_log is None:
+            return
+        self.send_log.save(self.send_log_path, hashes)
+        print(f"Saved {len(self.send_log)} send records to {self.send_log_path}")
 
     def flatten_messages(self,
-                         block_lists: List[List[Dict[str, Any]]]) -> List[Any]:
+                         block_lists: List[List[Dict[str, Any]]],
+                         serialised: bool = False) -> List[Any]:
+        block_hashes = list(itertools.chain(*block_lists['h']))
+
+        if serialised:
+            # one contiguous buffer (header + block per record) shared by all sockets
+            blocks = (self.serialise_block(block)
+                      for block_list in block_lists['b']
+                      for block in block_list)
+            messages = SerialisedMessages.from_serialised_blocks(
+                self.hdr.serialise_header(), blocks)
+            return messages, block_hashes
+
         messages = []
         for block_list in block_lists['b']:
             publish_msg = [
-                self.msg_publish(self.hdr, block_state.parse_from_json(block))
+                self.msg_publish(self.hdr, self.parse_block(block))
                 for block in block_list
             ]
             messages.extend(publish_msg)
 
-        block_hashes = list(itertools.chain(*block_lists['h']))
-
         return messages, block_hashes
 
+    @staticmethod
+    def parse_block(block: Any) -> block_state:
+        # binary corpora hold serialised blocks, json corpora block dicts
+        if isinstance(block, memoryview):
+            return block_state.parse(bytes(block))
+        return block_state.parse_from_json(block)
+
+    @staticmethod
+    def serialise_block(block: Any):
+        if isinstance(block, memoryview):
+            return block
+        return block_state.parse_from_json(block).serialise(False)
+
+    @staticmethod
+    def message_bytes(message: Any):
+        if isinstance(message, tuple):
+            # (index, message) of IndexedMessages
+            message = message[1]
+        if isinstance(message, memoryview):
+            return message
+        return message.serialise()
+
+    def get_pacer(self, socket: Dict[str, Any]) -> TokenBucketPacer:
+        # one pacer per peer, kept across rounds when streaming
+        if socket['peer'] not in self.pacers:
+            self.pacers[socket['peer']] = TokenBucketPacer(
+                LoadProfile(self.bps, self.load_profile))
+        return self.pacers[socket['peer']]
+
     async def publish_message(self, socket: Dict[str, Any], messages: List[Any]) -> None:
         if self.bps <= 0:
             raise ValueError("bps must be greater than 0")
 
-        start_time = time.time()
-        # Calculate time interval between messages based on bps
-        message_interval = 1 / self.bps
-        sent_messages = 0
-        # accumulated_time is required because asyncio.sleep(accumulated_time) accepts time in miliseconds only
-        accumulated_time = 0
-
+        pacer = self.get_pacer(socket)
         for idx, message in enumerate(messages):
             try:
-                # Send the message
-                socket['socket'].sendall(message.serialise())
-                sent_messages += 1
-
-                # Calculate time to wait before sending the next message
-                end_time = time.time()
-                elapsed_time = end_time - start_time
-                remaining_time = max(message_interval - elapsed_time, 0)
-                accumulated_time += remaining_time
-
-                # If accumulated_time reaches or exceeds 1 millisecond, sleep for accumulated_time and reset it
-                if accumulated_time >= 0.001:
-                    await asyncio.sleep(accumulated_time)
-                    accumulated_time = 0  # Reset after sleeping
-
-                # Reset start time for the next message
-                start_time = time.time()
+                # Wait until the send is due according to the load profile
+                await pacer.wait()
+                data = self.message_bytes(message)
+                start_ns = time.monotonic_ns()
+                await self.send_message(socket['socket'], data)
+                end_ns = time.monotonic_ns()
+                self.count_sent(socket, 1, len(data), start_ns, end_ns)
+                self.log_sent(socket, (message, ), end_ns)
             except Exception as e:
+                self.metrics.record_error(socket['peer'])
                 print(
                     f"Error sending message {idx+1} to {socket['peer']}: {str(e)}")
 
+    async def publish_batches(self, socket: Dict[str, Any], messages: List[Any]) -> None:
+        if self.bps <= 0:
+            raise ValueError("bps must be greater than 0")
+
+        pacer = self.get_pacer(socket)
+        tick_bytes = self.batch_stats.setdefault(self.channel_name(socket),
+                                                 array('Q'))
+        sent_messages = 0
+        while sent_messages < len(messages):
+            await pacer.wait()
+            # coalesce every message that is due in this tick
+            count = min(1 + pacer.available(), self.batch_size,
+                        len(messages) - sent_messages)
+            pacer.consume(count - 1)
+            batch = messages[sent_messages:sent_messages + count]
+            try:
+                buffers = [self.message_bytes(m) for m in batch]
+                start_ns = time.monotonic_ns()
+                sent_bytes = await self.send_batch(socket['socket'], buffers)
+                end_ns = time.monotonic_ns()
+                tick_bytes.append(sent_bytes)
+                self.count_sent(socket, count, sent_bytes, start_ns, end_ns)
+                self.log_sent(socket, batch, end_ns)
+            except Exception as e:
+                self.metrics.record_error(socket['peer'], count)
+                print(
+                    f"Error sending messages {sent_messages+1}-{sent_messages+count} to {socket['peer']}: {str(e)}")
+            sent_messages += count
+
+    async def send_batch(self, sock, buffers: List[Any]) -> int:
+        total = sum(len(b) for b in buffers)
+        try:
+            sent = sock.sendmsg(buffers)
+        except BlockingIOError:
+            sent = 0
+        if sent < total:
+            # socket buffer full, let the transport send the rest of the
+            # partly sent buffer and the buffers after it, without copying
+            for buffer in buffers:
+                if sent >= len(buffer):
+                    sent -= len(buffer)
+                    continue
+                await self.send_message(sock, memoryview(buffer)[sent:])
+                sent = 0
+        return total
+
+    def get_throughput_stats(self) -> dict:
+        duration = self.publish_duration
+        return {
+            "peers": [socket['peer'] for socket in self.peer_sockets()],
+            "sent_messages": self.sent_messages,
+            "duration_s": duration,
+            "bps": self.sent_messages / duration if duration > 0 else 0,
+            "channels": self.get_channel_stats(),
+            "bytes_received": self.get_bytes_received(),
+            "inbound_messages": self.inbound_messages,
+            "handshakes": self.handshake_engine.report,
+            "send_log_path": self.send_log_path,
+            "metrics": self.metrics.to_dict(duration),
+            "rounds": self.round_gate.rounds if self.round_gate else [],
+            "votes": self.vote_stats
+        }
+
+    def get_channel_stats(self) -> Dict[str, Dict[str, float]]:
+        duration = self.publish_duration
+        return {
+            channel: {
+                "sent_messages": messages,
+                "bytes": sent_bytes,
+                "bps": messages / duration if duration > 0 else 0
+            }
+            for channel, (messages, sent_bytes) in self.channel_stats.items()
+        }
+
+    def print_channel_stats(self) -> None:
+        for channel, stats in self.get_channel_stats().items():
+            print(f"{channel} sent_messages: {stats['sent_messages']} "
+                  f"bytes: {stats['bytes']} bps: {stats['bps']:.0f}")
+
+    def get_bytes_received(self) -> Dict[str, int]:
+        # the pooled drain counts across commands, report this run's sockets
+        if not self.drain:
+            return {}
+        received = {}
+        for socket in self.sockets:
+            sock = socket['socket']
+            received[socket['peer']] = received.get(
+                socket['peer'], 0) + self.drain.socket_bytes.get(
+                    sock, 0) - self.received_at_start.get(sock, 0)
+        return received
+
+    def print_receive_stats(self) -> None:
+        for peer, received in self.get_bytes_received().items():
+            print(f"{peer} bytes_received: {received}")
+        for peer, counts in self.inbound_messages.items():
+            print(f"{peer} inbound_messages: " +
+                  " ".join(f"{name}: {count}" for name, count in counts.items()))
+
+    def on_inbound(self, peer: str, hdr: message_header,
+                   payload: memoryview) -> None:
+        # called by the drain thread
+        if self.parse_inbound:
+            self.count_inbound(peer, hdr)
+        if self.vote_observer:
+            self.vote_observer.on_message(peer, hdr, payload)
+
+    def count_inbound(self, peer: str, hdr: message_header) -> None:
+        counts = self.inbound_messages.setdefault(peer, {})
+        name = message_type_enum_to_str(hdr.msg_type.type)
+        counts[name] = counts.get(name, 0) + 1
+
+    def print_batch_stats(self) -> None:
+        for channel, tick_bytes in self.batch_stats.items():
+            if not tick_bytes:
+                continue
+            print(f"{channel} ticks: {len(tick_bytes)} "
+                  f"bytes: {sum(tick_bytes)} "
+                  f"avg_bytes_per_tick: {sum(tick_bytes) / len(tick_bytes):.0f} "
+                  f"max_bytes_per_tick: {max(tick_bytes)}")
+
     # async def publish_message(self, socket: Dict[str, Any],
     #                           messages: List[Any]) -> None:
     #     start_time = time.time()
@@ -235,9 +843,32 @@ class SocketPublish:
     #                 f"Error sending message {idx+1} to {socket['peer']}: {str(e)}"
     #             )
 
+    async def publish(self, socket: Dict[str, Any], messages: List[Any]):
+        channels = self.peer_channels(socket)
+        if len(channels) == 1:
+            return await self.publish_channel(socket, messages)
+        # round-robin: channel i sends messages i, i + n, i + 2n, ...
+        await self.publish_channels(
+            channels,
+            [messages[i::len(channels)] for i in range(len(channels))])
+
+    async def publish_channels(self, channels: List[Dict[str, Any]],
+                               channel_messages: List[List[Any]]):
+        await asyncio.gather(*(
+            self.publish_channel(channel, messages)
+            for channel, messages in zip(channels, channel_messages)))
+
+    def publish_channel(self, socket: Dict[str, Any], messages: List[Any]):
+        if self.batch_size > 1:
+            return self.publish_batches(socket, messages)
+        return self.publish_message(socket, messages)
+
     def create_publish_tasks(self, sockets: List[Dict[str, Any]],
                              messages: List[Any]) -> List[asyncio.Task]:
-        if self.split:
+        if self.split_by_account:
+            tasks = self.create_account_split_tasks(
+                sockets[1:] if self.split_skip else sockets, messages)
+        elif self.split:
             tasks = self.create_split_tasks(sockets, messages)
         elif self.split_skip:
             tasks = self.create_split_tasks(sockets,
@@ -251,42 +882,72 @@ class SocketPublish:
             tasks = self.create_default_tasks(sockets, messages)
         return tasks
 
-    def consume_and_discard(self, socket_info):
-        sock = socket_info['socket']
-        # peer = socket_info['peer']
-        while True:
-            if self.read_socket(sock, 1024) is None:
-                time.sleep(0.25)
-                # print(f"No data from {peer}. Wait 100ms")
-
-    def read_socket(self, sock, byte_count: int) -> bytes or None:
-        try:
-            data = sock.recv(byte_count)
-            if not data:
-                return None
-            return data
-        except OSError as msg:
-            # Silently handle timeout errors and other OSError exceptions
-            print(f"Error reading from socket (peer: {sock.getpeername()}): {msg}")
-            return None
+    async def send_message(self, sock, data) -> None:
+        if self.transport == "asyncio":
+            # yields to the other peers' tasks while this socket is full
+            await asyncio.get_running_loop().sock_sendall(sock, data)
+        else:
+            sock.sendall(data)
 
+    def set_transport_mode(self):
+        for socket_info in self.sockets:
+            socket_info['socket'].setblocking(self.transport != "asyncio")
 
     def create_split_tasks(self, sockets, messages, skip_first_socket=False):
         num_sockets = len(sockets) - 1 if skip_first_socket else len(sockets)
         messages_per_socket, remainder = divmod(len(messages), num_sockets)
         tasks = []
         sockets_to_use = sockets[1:] if skip_first_socket else sockets
-        for i, socket in enumerate(sockets_to_use,
-                                   start=int(skip_first_socket)):
+        for i, socket in enumerate(sockets_to_use):
             start = i * messages_per_socket + min(i, remainder)
             end = start + messages_per_socket + (1 if i < remainder else 0)
-            tasks.append(self.publish_message(socket, messages[start:end]))
+            tasks.append(self.publish(socket, messages[start:end]))
         return tasks
 
+    @staticmethod
+    def message_account(message: Any) -> bytes:
+        if isinstance(message, tuple):
+            message = message[1]
+        if isinstance(message, memoryview):
+            # header (8 bytes), then the block starting with its account
+            return message[8:40]
+        return message.block.account
+
+    def create_account_split_tasks(self, sockets, messages):
+        slot_count = self.account_slot_count or len(sockets)
+        slots = self.account_slots or range(slot_count)
+        socket_by_slot = {
+            slot: i % len(sockets)
+            for i, slot in enumerate(slots)
+        }
+        channels = [self.peer_channels(socket) for socket in sockets]
+        positions = [[array('Q') for _ in c] for c in channels]
+        for pos, message in enumerate(messages):
+            # stable across processes, unlike hash()
+            account_hash = zlib.crc32(self.message_account(message))
+            target = socket_by_slot.get(account_hash % slot_count)
+            if target is not None:
+                # the chain stays on one of the peer's channels as well
+                channel = account_hash // slot_count % len(channels[target])
+                positions[target][channel].append(pos)
+        return [
+            self.publish_channels(socket_channels, [
+                MessageSubset(messages, channel_positions)
+                for channel_positions in socket_positions
+            ]) for socket_channels, socket_positions in zip(
+                channels, positions)
+        ]
+
     def create_shuffle_tasks(self, sockets, messages):
+        # every peer gets its own lazily evaluated permutation, seeded by
+        # peer so worker processes don't repeat each other's order
         tasks = [
-            self.publish_message(socket, random.sample(messages,
-                                                       len(messages)))
+            self.publish(
+                socket,
+                MessageSubset(
+                    messages,
+                    IndexPermutation(len(messages),
+                                     f"{self.shuffle_seed}-{socket['peer']}")))
             for socket in sockets
         ]
         return tasks
@@ -297,19 +958,104 @@ class SocketPublish:
         return tasks
 
     def create_default_tasks(self, sockets, messages):
-        tasks = [self.publish_message(socket, messages) for socket in sockets]
+        tasks = [self.publish(socket, messages) for socket in sockets]
         return tasks
 
-    async def run(self, messages: List[Any]) -> int:
-        for socket_info in self.sockets:
-            threading.Thread(target=self.consume_and_discard, args=(socket_info,), daemon=True).start()
-
+    async def start_publishing(self) -> None:
+        self.sockets = await self.connect_peers()
+        self.set_transport_mode()
+        # a single thread drains what the nodes send back on every socket
+        if self.pool:
+            self.drain = self.pool.drain
+        else:
+            self.drain = ReceiveDrain(self.sockets,
+                                      frame_messages=self.frame_inbound)
+            self.drain.start()
+        self.received_at_start = {
+            socket['socket']: self.drain.socket_bytes.get(socket['socket'], 0)
+            for socket in self.sockets
+        }
+        if self.frame_inbound:
+            self.drain.set_on_message(self.sockets, self.on_inbound)
+        await self.completion.initialize()
+        if self.round_gate:
+            await self.round_gate.initialize()
 
-        tasks = self.create_publish_tasks(self.sockets, messages)
-        await asyncio.gather(*tasks)
+    async def finish_publishing(self, message_count: int) -> None:
+        self.print_batch_stats()
+        self.print_channel_stats()
+        self.metrics.print_summary(self.publish_duration)
         # make sure the last few blocks are published.
-        # ideally this would check if all messages are received
-        await asyncio.sleep(15)
+        await self.completion.wait(self.sockets, message_count)
+        if self.vote_observer:
+            await self.vote_observer.wait()
+        self.print_receive_stats()
+
+    def release_sockets(self) -> None:
+        if self.pool:
+            if self.drain:
+                self.drain.set_on_message(self.sockets, None)
+            for socket_info in self.sockets:
+                self.pool.release(socket_info)
+            return
+        if self.drain:
+            self.drain.stop()
+        for socket_info in self.sockets:
+            socket_info['socket'].close()
+
+    async def run(self, messages: List[Any]) -> int:
+        try:
+            await self.start_publishing()
+            if self.send_log is not None:
+                messages = IndexedMessages(messages)
+            tasks = self.create_publish_tasks(self.peer_sockets(), messages)
+            start_time = time.perf_counter()
+            self.metrics.start(time.monotonic_ns())
+            await asyncio.gather(*tasks)
+            self.publish_duration = time.perf_counter() - start_time
+            await self.finish_publishing(len(messages))
+        finally:
+            self.release_sockets()
 
         message_count = len(messages)
         return message_count
+
+    def prepare_round(self, rounds) -> Any:
+        block_list = next(rounds, None)
+        if block_list is None:
+            return None
+        messages, _ = self.flatten_messages({'b': [block_list], 'h': []},
+                                            serialised=self.preserialise)
+        return messages
+
+    async def run_stream(self, rounds) -> int:
+        try:
+            await self.start_publishing()
+            loop = asyncio.get_running_loop()
+            start_time = time.perf_counter()
+            self.metrics.start(time.monotonic_ns())
+            message_count = 0
+            next_round = loop.run_in_executor(None, self.prepare_round,
+                                              rounds)
+            while True:
+                messages = await next_round
+                if messages is None:
+                    break
+                # decode the next round while the current one is sent
+                next_round = loop.run_in_executor(None, self.prepare_round,
+                                                  rounds)
+                if self.send_log is not None:
+                    messages = IndexedMessages(messages, base=message_count)
+                round_start = time.perf_counter()
+                tasks = self.create_publish_tasks(self.peer_sockets(),
+                                                  messages)
+                await asyncio.gather(*tasks)
+                message_count += len(messages)
+                if self.round_gate:
+                    await self.round_gate.wait(len(messages), round_start,
+                                               time.perf_counter())
+            self.publish_duration = time.perf_counter() - start_time
+            await self.finish_publishing(message_count)
+        finally:
+            self.release_sockets()
+        return message_count
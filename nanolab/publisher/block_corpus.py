@@ -0,0 +1,148 @@
+from nanolab.xnomin.peers import block_state, hexlify
+from nanolab.src.json_stream import iter_json_array
+from collections.abc import Sequence
+from array import array
+import binascii
+import json
+import mmap
+import struct
+
+# Binary block corpus layout (little endian hosts):
+#   header   magic, version, block_count, round_count and section offsets
+#   blocks   block_count * 216 bytes, block_state.serialise(False)
+#   index    (round_count + 1) * u64, first block of every round
+#   hashes   block_count * 32 bytes
+#   seeds    utf-8 json of the corpus "s" list
+CORPUS_MAGIC = b"NLBC"
+CORPUS_VERSION = 1
+CORPUS_HEADER = struct.Struct("<4sIQQQQQQQ")
+BLOCK_SIZE = 216
+HASH_SIZE = 32
+
+
+def is_binary_corpus(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(CORPUS_MAGIC)) == CORPUS_MAGIC
+
+
+class FixedSizeRecords(Sequence):
+    """Sequence view on fixed size records of a buffer, slicing does not copy."""
+
+    def __init__(self, data: memoryview, record_size: int, as_hex: bool = False):
+        self.data = data
+        self.record_size = record_size
+        self.as_hex = as_hex
+
+    def __len__(self):
+        return len(self.data) // self.record_size
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            stop = max(start, stop)
+            return FixedSizeRecords(
+                self.data[start * self.record_size:stop * self.record_size],
+                self.record_size, self.as_hex)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("record index out of range")
+        record = self.data[idx * self.record_size:(idx + 1) * self.record_size]
+        return hexlify(record) if self.as_hex else record
+
+
+class BlockCorpus:
+    """Memory mapped binary block corpus. Rounds are located through the
+    round index, nothing is parsed when selecting blocks."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.block_count, self.round_count,
+         blocks_offset, index_offset, hashes_offset, seeds_offset,
+         seeds_length) = CORPUS_HEADER.unpack_from(self.mmap)
+        if magic != CORPUS_MAGIC:
+            raise ValueError(f"{path} is not a binary block corpus")
+        if version != CORPUS_VERSION:
+            raise ValueError(f"Unsupported block corpus version: {version}")
+
+        data = memoryview(self.mmap)
+        self.blocks = data[blocks_offset:blocks_offset +
+                           self.block_count * BLOCK_SIZE]
+        self.index = data[index_offset:index_offset +
+                          (self.round_count + 1) * 8].cast('Q')
+        self.hashes = data[hashes_offset:hashes_offset +
+                           self.block_count * HASH_SIZE]
+        self.seeds_data = data[seeds_offset:seeds_offset + seeds_length]
+
+    def round_blocks(self, round_index: int) -> FixedSizeRecords:
+        start, end = self.index[round_index], self.index[round_index + 1]
+        return FixedSizeRecords(
+            self.blocks[start * BLOCK_SIZE:end * BLOCK_SIZE], BLOCK_SIZE)
+
+    def round_hashes(self, round_index: int) -> FixedSizeRecords:
+        start, end = self.index[round_index], self.index[round_index + 1]
+        return FixedSizeRecords(
+            self.hashes[start * HASH_SIZE:end * HASH_SIZE], HASH_SIZE,
+            as_hex=True)
+
+    def seeds(self) -> list:
+        return json.loads(bytes(self.seeds_data)) if self.seeds_data else []
+
+    def to_dict(self) -> dict:
+        # same shape as the json corpus, every entry is a view on the mmap
+        return {
+            "s": self.seeds(),
+            "h": [self.round_hashes(r) for r in range(self.round_count)],
+            "b": [self.round_blocks(r) for r in range(self.round_count)]
+        }
+
+
+def convert_json_corpus(json_path: str, corpus_path: str) -> dict:
+    """Converts a {"s", "h", "b"} json corpus into the binary format.
+    The json file is streamed, blocks are never all held in memory."""
+    round_index = array('Q', [0])
+    with open(corpus_path, "wb") as f:
+        f.write(b"\x00" * CORPUS_HEADER.size)
+
+        blocks_offset = f.tell()
+        for block_list in iter_json_array(json_path, "b"):
+            for block in block_list:
+                f.write(block_state.parse_from_json(block).serialise(False))
+            round_index.append(round_index[-1] + len(block_list))
+        block_count = round_index[-1]
+        round_count = len(round_index) - 1
+
+        index_offset = f.tell()
+        f.write(round_index.tobytes())
+
+        hashes_offset = f.tell()
+        hash_rounds = 0
+        for round, hash_list in enumerate(iter_json_array(json_path, "h")):
+            if round >= round_count or len(hash_list) != round_index[
+                    round + 1] - round_index[round]:
+                raise ValueError(
+                    f"Hashes of round {round} do not match its blocks")
+            for block_hash in hash_list:
+                f.write(binascii.unhexlify(block_hash))
+            hash_rounds += 1
+        if hash_rounds != round_count:
+            raise ValueError("Number of hash rounds does not match blocks")
+
+        seeds_offset = f.tell()
+        try:
+            seeds = list(iter_json_array(json_path, "s"))
+        except KeyError:
+            seeds = []
+        seeds_data = json.dumps(seeds).encode() if seeds else b""
+        f.write(seeds_data)
+
+        f.seek(0)
+        f.write(
+            CORPUS_HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, block_count,
+                               round_count, blocks_offset, index_offset,
+                               hashes_offset, seeds_offset, len(seeds_data)))
+
+    return {"blocks": block_count, "rounds": round_count}
@@ -0,0 +1,90 @@
+from nanolab.xnomin.peers import block_state
+from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+from array import array
+import binascii
+import itertools
+
+
+def block_dependencies(block: Any) -> Tuple[bytes, Optional[bytes]]:
+    """previous and link of a block_state, a serialised block of a binary
+    corpus or a json block. The link of a json send is an account address
+    and never matches a block hash."""
+    if isinstance(block, block_state):
+        return block.previous, block.link
+    if isinstance(block, memoryview):
+        return bytes(block[32:64]), bytes(block[112:144])
+    link = block['link']
+    return (binascii.unhexlify(block['previous']),
+            binascii.unhexlify(link) if len(link) == 64 else None)
+
+
+def dependency_order(hashes: List[str],
+                     blocks: List[Any]) -> Tuple[array, Dict[str, int]]:
+    """Orders blocks so that every block follows its previous block and
+    the send it receives (link), as far as they are part of the corpus.
+    Runs in linear time through a hash index and keeps file order for
+    blocks whose dependencies are already met.
+
+    Returns the new order as positions into blocks and a report of how
+    many blocks depended on a later block of the file."""
+    index = {binascii.unhexlify(h): pos for pos, h in enumerate(hashes)}
+    emitted = bytearray(len(blocks))
+    waiting = array('I', [0]) * len(blocks)
+    dependents: Dict[int, List[int]] = {}
+    order = array('Q')
+    out_of_order = 0
+
+    for pos, block in enumerate(blocks):
+        unmet = []
+        later = False
+        for dependency in block_dependencies(block):
+            dep_pos = index.get(dependency)
+            if dep_pos is None or dep_pos == pos or emitted[dep_pos]:
+                continue
+            unmet.append(dep_pos)
+            later = later or dep_pos > pos
+        out_of_order += later
+        if unmet:
+            waiting[pos] = len(unmet)
+            for dep_pos in unmet:
+                dependents.setdefault(dep_pos, []).append(pos)
+            continue
+
+        # emit the block and every block that was only waiting for it
+        ready = deque((pos, ))
+        while ready:
+            ready_pos = ready.popleft()
+            emitted[ready_pos] = 1
+            order.append(ready_pos)
+            for dependent in dependents.pop(ready_pos, ()):
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+
+    # dependency cycles can't be ordered, they keep their file order
+    unresolved = [pos for pos in range(len(blocks)) if not emitted[pos]]
+    order.extend(unresolved)
+    return order, {
+        "blocks": len(blocks),
+        "out_of_order": out_of_order,
+        "unresolved": len(unresolved)
+    }
+
+
+def print_order_report(report: Dict[str, int]) -> None:
+    print(f"dependency order: {report['out_of_order']} of {report['blocks']} "
+          f"blocks depended on a later block, "
+          f"{report['unresolved']} unresolved")
+
+
+def order_block_lists(block_lists: Dict[str, list]) -> Dict[str, list]:
+    """Flattens the rounds of block_lists into one dependency ordered round."""
+    hashes = list(itertools.chain(*block_lists['h']))
+    blocks = list(itertools.chain(*block_lists['b']))
+    order, report = dependency_order(hashes, blocks)
+    print_order_report(report)
+    return {
+        'h': [[hashes[pos] for pos in order]],
+        'b': [[blocks[pos] for pos in order]]
+    }
@@ -2,6 +2,13 @@ from nanorpc.client import NanoRpcTyped
 from nanolab.src.utils import get_config_parser
 from time import strftime, gmtime, time
 from math import ceil
+from typing import List
+
+
+def percentile(sorted_data: List[float], percent: float) -> float:
+    # nearest rank: the smallest value with at least percent % of the data
+    # at or below it
+    return sorted_data[max(ceil(len(sorted_data) * percent / 100) - 1, 0)]
 
 
 class ConfirmationStatsManager:
@@ -38,13 +45,8 @@ class ConfirmationCalculator:
         self.start_time = time()
         self.events = []  # Add this list to keep track of events
 
-    def _percentile(self, data, percentile):
-        n = len(data)
-        p = n * percentile / 100
-        if p.is_integer():
-            return sorted(data)[int(p)]
-        else:
-            return sorted(data)[int(ceil(p)) - 1]
+    def _percentile(self, data, percent):
+        return percentile(sorted(data), percent)
 
     def add_event(self, event):
         # You might want to change the structure of the data in the list
@@ -0,0 +1,84 @@
+from nanolab.publisher.receive_drain import ReceiveDrain
+from typing import Any, Dict, Optional, Tuple
+import atexit
+import threading
+
+# ("ip:port", network id, inbound messages framed)
+PoolKey = Tuple[str, int, bool]
+
+
+class ConnectionPool:
+    """Handshaked realtime connections shared by all publish commands of
+    this process. A connection is used by one publisher at a time: it is
+    acquired before publishing and released afterwards. Every pooled socket
+    is drained by one shared ReceiveDrain for its whole lifetime."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle: Dict[PoolKey, list] = {}
+        self.closed = False
+        # framing can only start at registration, a connection is framed
+        # when its socket_info asks for it and is pooled under that key
+        self.drain = ReceiveDrain([])
+        self.drain.start()
+
+    def acquire(self, key: PoolKey) -> Optional[Dict[str, Any]]:
+        while True:
+            with self.lock:
+                connections = self.idle.get(key)
+                if not connections:
+                    return None
+                socket_info = connections.pop()
+            if self.drain.is_alive(socket_info['socket']):
+                return socket_info
+            print(f"Discard stale connection to {socket_info['peer']}")
+            self.drain.close(socket_info)
+
+    def track(self, socket_info: Dict[str, Any]) -> None:
+        # new connections are drained from the moment they are handed out
+        self.drain.add(socket_info)
+
+    def release(self, socket_info: Dict[str, Any]) -> None:
+        with self.lock:
+            if not self.closed:
+                self.idle.setdefault(socket_info['key'],
+                                     []).append(socket_info)
+                return
+        socket_info['socket'].close()
+
+    def size(self) -> int:
+        with self.lock:
+            return sum(len(c) for c in self.idle.values())
+
+    def shutdown(self) -> None:
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for socket_info in connections:
+                self.drain.close(socket_info)
+        self.drain.stop()
+
+
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> ConnectionPool:
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = ConnectionPool()
+        return _connection_pool
+
+
+def close_connection_pool() -> None:
+    # closes every idle connection, the next publish command starts a new pool
+    global _connection_pool
+    with _connection_pool_lock:
+        pool, _connection_pool = _connection_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+atexit.register(close_connection_pool)
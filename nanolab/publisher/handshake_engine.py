@@ -0,0 +1,113 @@
+from nanolab.xnomin.handshake import node_handshake_id
+from typing import Any, Dict, List, Optional
+import asyncio
+import socket
+import time
+
+
+def create_socket() -> socket.socket:
+    # dual stack like get_connected_socket_endpoint, but non-blocking
+    s = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+    s.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+    s.setblocking(False)
+    return s
+
+
+class HandshakeEngine:
+    """Connects and handshakes many peers concurrently on the event loop.
+
+    At most `concurrency` peers are in flight at once. A failed peer is
+    retried with exponential backoff. Connect and handshake latency of
+    every peer is kept in `report`."""
+
+    def __init__(self, ctx: Dict[str, Any], params: Dict[str, Any] = None):
+        params = params or {}
+        self.ctx = ctx
+        self.concurrency = int(params.get("handshake_concurrency", 100))
+        self.retries = int(params.get("handshake_retries", 2))
+        if self.retries < 0:
+            raise ValueError(f"Invalid handshake_retries: {self.retries}")
+        self.backoff_s = float(params.get("handshake_backoff_s", 0.1))
+        self.connect_timeout_s = float(params.get("connect_timeout_s", 3))
+        self.handshake_timeout_s = float(
+            params.get("handshake_timeout_s", 5))
+        self.report: List[Dict[str, Any]] = []
+
+    async def handshake(self, addr: str, port: int) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        s = create_socket()
+        try:
+            start_time = time.perf_counter()
+            await asyncio.wait_for(loop.sock_connect(s, (addr, port)),
+                                   self.connect_timeout_s)
+            connected_time = time.perf_counter()
+            signing_key, verifying_key = node_handshake_id.keypair()
+            account = await asyncio.wait_for(
+                node_handshake_id.perform_handshake_exchange_async(
+                    self.ctx, s, signing_key, verifying_key),
+                self.handshake_timeout_s)
+            end_time = time.perf_counter()
+        except BaseException:
+            s.close()
+            raise
+        return {
+            "socket": s,
+            "account": account,
+            "connect_ms": (connected_time - start_time) * 1000,
+            "handshake_ms": (end_time - connected_time) * 1000
+        }
+
+    async def connect_peer(self, addr: str,
+                           port: int) -> Optional[socket.socket]:
+        peer = f"{addr}:{port}"
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.backoff_s * 2**(attempt - 1))
+            try:
+                result = await self.handshake(addr, port)
+            except (OSError, ValueError, AssertionError,
+                    asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+                continue
+            self.report.append({
+                "peer": peer,
+                "attempts": attempt + 1,
+                "connect_ms": result["connect_ms"],
+                "handshake_ms": result["handshake_ms"],
+                "error": None
+            })
+            return result["socket"]
+
+        print(f"Handshake with {peer} failed: {error}")
+        self.report.append({
+            "peer": peer,
+            "attempts": self.retries + 1,
+            "connect_ms": None,
+            "handshake_ms": None,
+            "error": error
+        })
+        return None
+
+    async def connect_all(self, endpoints: List[tuple]) -> list:
+        """Returns one socket (or None on failure) per (addr, port)."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(addr, port):
+            async with semaphore:
+                return await self.connect_peer(addr, port)
+
+        return await asyncio.gather(*(bounded(addr, port)
+                                      for addr, port in endpoints))
+
+    def print_report(self, duration: float) -> None:
+        connected = [r for r in self.report if r["error"] is None]
+        print(f"Handshaked {len(connected)}/{len(self.report)} peers "
+              f"in {duration:.3f}s")
+        for r in sorted(self.report, key=lambda r: r["peer"]):
+            if r["error"] is None:
+                print(f"  {r['peer']:<40} connect {r['connect_ms']:8.2f}ms "
+                      f"handshake {r['handshake_ms']:8.2f}ms "
+                      f"attempts {r['attempts']}")
+            else:
+                print(f"  {r['peer']:<40} failed after {r['attempts']} "
+                      f"attempts: {r['error']}")
@@ -0,0 +1,92 @@
+from nanorpc.client import NanoRpcTyped
+from nanolab.src.utils import get_config_parser
+from typing import Any, Dict, List
+import asyncio
+import fcntl
+import inspect
+import struct
+import termios
+import time
+
+# SIOCOUTQ shares its value with TIOCOUTQ on Linux
+SIOCOUTQ = getattr(termios, "TIOCOUTQ", 0x5411)
+
+
+def unsent_bytes(sock) -> int:
+    # bytes queued in the kernel that the peer has not acknowledged yet
+    try:
+        res = fcntl.ioctl(sock.fileno(), SIOCOUTQ, struct.pack("i", 0))
+        return struct.unpack("i", res)[0]
+    except OSError:
+        return 0
+
+
+class PublishCompletion:
+    """Decides when published messages can be considered delivered.
+
+    modes:
+      sleep       wait completion_timeout_s (legacy behaviour)
+      send_queue  wait until the kernel send queue of every socket is empty
+      block_count send_queue, then wait until block_count of completion_node
+                  grew by the number of published blocks
+    """
+
+    MODES = ("sleep", "send_queue", "block_count")
+
+    def __init__(self, params: Dict[str, Any]):
+        self.mode = params.get("completion", "send_queue")
+        if self.mode not in self.MODES:
+            raise ValueError(f"Invalid completion mode: {self.mode}")
+        self.timeout_s = float(params.get("completion_timeout_s", 15))
+        self.interval_s = float(params.get("completion_interval_s", 0.25))
+        self.node_name = params.get("completion_node")
+        self.nano_rpc = None
+        self.start_block_count = 0
+
+    async def initialize(self) -> None:
+        if self.mode != "block_count":
+            return
+        conf_p = get_config_parser()
+        node_name = self.node_name if self.node_name else conf_p.get_nodes_name()[:-1]
+        self.nano_rpc = NanoRpcTyped(conf_p.get_node_rpc(node_name))
+        self.start_block_count = await self._block_count()
+
+    async def _block_count(self) -> int:
+        block_count = await self.nano_rpc.block_count()
+        return int(block_count["count"])
+
+    async def wait(self, sockets: List[Dict[str, Any]], published_blocks: int) -> bool:
+        start_time = time.time()
+        if self.mode == "sleep":
+            await asyncio.sleep(self.timeout_s)
+            return True
+
+        done = await self._wait_condition(
+            lambda: self._send_queues_empty(sockets), start_time, 0.01)
+        if done and self.mode == "block_count":
+            done = await self._wait_condition(
+                lambda: self._block_count_reached(published_blocks),
+                start_time, self.interval_s)
+
+        if not done:
+            print(f"Publish completion ({self.mode}) not reached after {self.timeout_s}s")
+        return done
+
+    async def _wait_condition(self, condition, start_time: float,
+                              interval: float) -> bool:
+        while True:
+            done = condition()
+            if inspect.isawaitable(done):
+                done = await done
+            if done:
+                return True
+            if time.time() - start_time >= self.timeout_s:
+                return False
+            await asyncio.sleep(interval)
+
+    def _send_queues_empty(self, sockets: List[Dict[str, Any]]) -> bool:
+        return all(unsent_bytes(socket['socket']) == 0 for socket in sockets)
+
+    async def _block_count_reached(self, published_blocks: int) -> bool:
+        block_count = await self._block_count()
+        return block_count - self.start_block_count >= published_blocks
@@ -0,0 +1,123 @@
+from nanolab.publisher.confirmation_stats import ConfirmationTableFormatter
+from typing import Any, Dict, List
+from array import array
+from bisect import bisect_left
+
+# upper bounds of the inter-send interval histogram buckets in microseconds,
+# the last bucket holds everything above
+INTERVAL_BUCKETS_US = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000,
+                       1000000)
+
+
+class PeerMetrics:
+
+    def __init__(self, interval_s: float):
+        self.interval_ns = int(interval_s * 1e9)
+        self.sent_messages = 0
+        self.bytes_sent = 0
+        self.errors = 0
+        self.blocked_ns = 0
+        self.last_send_ns = None
+        # messages sent per interval_s since the publisher started
+        self.messages_over_time = array('Q')
+        self.interval_histogram = array('Q', [0] * (len(INTERVAL_BUCKETS_US) + 1))
+
+    def record_send(self, origin_ns: int, start_ns: int, end_ns: int,
+                    messages: int, sent_bytes: int) -> None:
+        self.sent_messages += messages
+        self.bytes_sent += sent_bytes
+        self.blocked_ns += end_ns - start_ns
+        if self.last_send_ns is not None:
+            interval_us = (start_ns - self.last_send_ns) / 1000
+            self.interval_histogram[bisect_left(INTERVAL_BUCKETS_US,
+                                                interval_us)] += 1
+        self.last_send_ns = start_ns
+        bucket = max(end_ns - origin_ns, 0) // self.interval_ns
+        if bucket >= len(self.messages_over_time):
+            self.messages_over_time.extend(
+                [0] * (bucket + 1 - len(self.messages_over_time)))
+        self.messages_over_time[bucket] += messages
+
+    def bps_over_time(self) -> List[float]:
+        interval_s = self.interval_ns / 1e9
+        return [m / interval_s for m in self.messages_over_time]
+
+    def interval_percentile(self, percent: float) -> str:
+        # upper bound of the histogram bucket holding the percentile
+        total = sum(self.interval_histogram)
+        if total == 0:
+            return "-"
+        rank = total * percent / 100
+        seen = 0
+        for bound, count in zip(INTERVAL_BUCKETS_US, self.interval_histogram):
+            seen += count
+            if seen >= rank:
+                return f"<={bound}us"
+        return f">{INTERVAL_BUCKETS_US[-1]}us"
+
+    def to_dict(self, duration_s: float) -> Dict[str, Any]:
+        labels = [f"<={b}us" for b in INTERVAL_BUCKETS_US]
+        labels.append(f">{INTERVAL_BUCKETS_US[-1]}us")
+        return {
+            "sent_messages": self.sent_messages,
+            "bytes_sent": self.bytes_sent,
+            "errors": self.errors,
+            "blocked_s": self.blocked_ns / 1e9,
+            "bps": self.sent_messages / duration_s if duration_s > 0 else 0,
+            "bps_over_time": self.bps_over_time(),
+            "interval_histogram": dict(zip(labels, self.interval_histogram))
+        }
+
+
+class PublishMetrics:
+    """Per peer send metrics of a publisher: achieved bps over time,
+    inter-send interval histogram, time spent in send, bytes and errors.
+    Shows whether the load generator kept up with the configured rate."""
+
+    def __init__(self, interval_s: float = 1.0):
+        self.interval_s = interval_s
+        self.start_ns = None
+        self.peers: Dict[str, PeerMetrics] = {}
+
+    def start(self, start_ns: int) -> None:
+        if self.start_ns is None:
+            self.start_ns = start_ns
+
+    def peer(self, peer: str) -> PeerMetrics:
+        if peer not in self.peers:
+            self.peers[peer] = PeerMetrics(self.interval_s)
+        return self.peers[peer]
+
+    def record_send(self, peer: str, start_ns: int, end_ns: int,
+                    messages: int, sent_bytes: int) -> None:
+        # time 0 of bps_over_time is the first send unless started earlier
+        self.start(start_ns)
+        self.peer(peer).record_send(self.start_ns, start_ns, end_ns, messages,
+                                    sent_bytes)
+
+    def record_error(self, peer: str, messages: int = 1) -> None:
+        self.peer(peer).errors += messages
+
+    def to_dict(self, duration_s: float) -> Dict[str, Dict[str, Any]]:
+        return {
+            peer: metrics.to_dict(duration_s)
+            for peer, metrics in self.peers.items()
+        }
+
+    def print_summary(self, duration_s: float) -> None:
+        table = [("peer", "messages", "bytes", "errors", "blocked_s", "bps",
+                  "bps_min", "bps_max", "interval_p50", "interval_p99")]
+        for peer, metrics in self.peers.items():
+            # the last interval is usually partial
+            bps = metrics.bps_over_time()[:-1] or metrics.bps_over_time()
+            table.append(
+                (peer, metrics.sent_messages, metrics.bytes_sent,
+                 metrics.errors, f"{metrics.blocked_ns / 1e9:.2f}",
+                 f"{metrics.sent_messages / duration_s:.0f}"
+                 if duration_s > 0 else "0", f"{min(bps, default=0):.0f}",
+                 f"{max(bps, default=0):.0f}",
+                 metrics.interval_percentile(50),
+                 metrics.interval_percentile(99)))
+        table = [[str(cell) for cell in row] for row in table]
+        for line in ConfirmationTableFormatter().format_table(table):
+            print(line)
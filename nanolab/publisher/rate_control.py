@@ -0,0 +1,182 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List
+import asyncio
+import math
+import time
+
+
+class ILoadPhase(ABC):
+
+    @abstractmethod
+    def __init__(self, config: dict):
+        pass
+
+    @abstractmethod
+    def rate_at(self, elapsed_s: float) -> float:
+        pass
+
+
+class ConstantPhase(ILoadPhase):
+    # {"type": "constant", "bps": 1000, "duration_s": 30}
+
+    def __init__(self, config: dict):
+        self.duration_s = float(config["duration_s"])
+        self.bps = float(config["bps"])
+
+    def rate_at(self, elapsed_s: float) -> float:
+        return self.bps
+
+
+class RampPhase(ILoadPhase):
+    # {"type": "ramp", "start_bps": 100, "end_bps": 5000, "duration_s": 60}
+
+    def __init__(self, config: dict):
+        self.duration_s = float(config["duration_s"])
+        self.start_bps = float(config["start_bps"])
+        self.end_bps = float(config["end_bps"])
+
+    def rate_at(self, elapsed_s: float) -> float:
+        progress = min(elapsed_s / self.duration_s, 1)
+        return self.start_bps + (self.end_bps - self.start_bps) * progress
+
+
+class StepPhase(ILoadPhase):
+    # {"type": "step", "start_bps": 500, "step_bps": 500, "step_s": 10, "duration_s": 60}
+
+    def __init__(self, config: dict):
+        self.duration_s = float(config["duration_s"])
+        self.start_bps = float(config["start_bps"])
+        self.step_bps = float(config["step_bps"])
+        self.step_s = float(config["step_s"])
+
+    def rate_at(self, elapsed_s: float) -> float:
+        steps = int(elapsed_s // self.step_s)
+        return max(self.start_bps + steps * self.step_bps, 0)
+
+
+class BurstPhase(ILoadPhase):
+    # {"type": "burst", "bps": 5000, "burst_s": 2, "idle_s": 3, "idle_bps": 0, "duration_s": 60}
+
+    def __init__(self, config: dict):
+        self.duration_s = float(config["duration_s"])
+        self.bps = float(config["bps"])
+        self.burst_s = float(config["burst_s"])
+        self.idle_s = float(config["idle_s"])
+        self.idle_bps = float(config.get("idle_bps", 0))
+
+    def rate_at(self, elapsed_s: float) -> float:
+        position = elapsed_s % (self.burst_s + self.idle_s)
+        return self.bps if position < self.burst_s else self.idle_bps
+
+
+class SinePhase(ILoadPhase):
+    # {"type": "sine", "bps": 1000, "amplitude_bps": 500, "period_s": 20, "duration_s": 60}
+
+    def __init__(self, config: dict):
+        self.duration_s = float(config["duration_s"])
+        self.bps = float(config["bps"])
+        self.amplitude_bps = float(config["amplitude_bps"])
+        self.period_s = float(config["period_s"])
+
+    def rate_at(self, elapsed_s: float) -> float:
+        angle = 2 * math.pi * elapsed_s / self.period_s
+        return max(self.bps + self.amplitude_bps * math.sin(angle), 0)
+
+
+class LoadPhaseFactory:
+
+    @staticmethod
+    def create(config: dict) -> ILoadPhase:
+        phases = {
+            'constant': ConstantPhase,
+            'ramp': RampPhase,
+            'step': StepPhase,
+            'burst': BurstPhase,
+            'sine': SinePhase,
+        }
+        if config['type'] not in phases:
+            raise ValueError(f"Invalid load phase type: {config['type']}")
+        return phases[config['type']](config)
+
+
+class LoadProfile:
+    """Target bps over time. Phases run in sequence, afterwards the
+    default bps applies."""
+
+    def __init__(self, default_bps: float, phases: List[Dict] = None):
+        self.default_bps = float(default_bps)
+        self.phases = [LoadPhaseFactory.create(p) for p in phases or []]
+
+    def rate_at(self, elapsed_s: float) -> float:
+        for phase in self.phases:
+            if elapsed_s < phase.duration_s:
+                return phase.rate_at(elapsed_s)
+            elapsed_s -= phase.duration_s
+        return self.default_bps
+
+
+class TokenBucketPacer:
+    """Paces sends against the wall clock instead of per-message sleeps.
+
+    Tokens are refilled from the absolute time elapsed since the last refill,
+    so oversleeping is paid back with tokens and the average rate does not
+    drift below the target. At most `capacity_s` worth of tokens can be
+    stored, which bounds the catch-up burst after a stall. The bucket holds
+    at least MIN_CAPACITY tokens: with a single token, the fraction gained
+    by oversleeping would be capped away on every send at low rates.
+    """
+
+    IDLE_POLL_S = 0.01
+    MIN_SLEEP_S = 0.001
+    MIN_CAPACITY = 2.0
+
+    def __init__(self,
+                 profile: LoadProfile,
+                 capacity_s: float = 0.1,
+                 clock=time.perf_counter):
+        self.profile = profile
+        self.capacity_s = capacity_s
+        self.clock = clock
+        self.start_time = None
+        self.last_refill = None
+        self.tokens = 0.0
+
+    def start(self) -> None:
+        self.start_time = self.last_refill = self.clock()
+        self.tokens = 1.0  # first message leaves immediately
+
+    def elapsed(self) -> float:
+        return self.clock() - self.start_time
+
+    def refill(self) -> float:
+        if self.start_time is None:
+            self.start()
+        now = self.clock()
+        rate = self.profile.rate_at(now - self.start_time)
+        capacity = max(self.MIN_CAPACITY, rate * self.capacity_s)
+        self.tokens = min(self.tokens + (now - self.last_refill) * rate,
+                          capacity)
+        self.last_refill = now
+        return rate
+
+    def available(self) -> int:
+        self.refill()
+        return int(self.tokens)
+
+    def delay(self) -> float:
+        rate = self.refill()
+        if self.tokens >= 1:
+            return 0
+        if rate <= 0:
+            return self.IDLE_POLL_S
+        return max((1 - self.tokens) / rate, self.MIN_SLEEP_S)
+
+    def consume(self, count: int = 1) -> None:
+        self.tokens -= count
+
+    async def wait(self) -> None:
+        delay = self.delay()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.delay()
+        self.consume()
@@ -0,0 +1,166 @@
+from nanolab.xnomin.message_stream import message_stream
+from nanolab.xnomin.peers import message_header
+from typing import Any, Callable, Dict, List
+import selectors
+import threading
+
+
+class ReceiveDrain:
+    """Reads and discards inbound traffic of many sockets in a single thread.
+
+    Every socket is registered with one selector, so the node side never
+    blocks on full receive buffers while the publisher only needs one
+    thread. Received bytes are counted per peer and can optionally be
+    handed to `on_data(peer, data)`; `data` is only valid during the call.
+
+    With `frame_messages` (or a socket_info with "frame_messages" set), a
+    socket's traffic is framed into wire protocol messages from the moment
+    it is registered (recv chunks don't line up with message boundaries, so
+    framing can't start later) and the
+    messages are handed to `on_message(peer, header, payload)` while it is
+    set, or to the socket's own callback set by set_on_message(). A socket
+    whose traffic can't be framed is no longer framed, its bytes are only
+    counted.
+    """
+
+    def __init__(self,
+                 sockets: List[Dict[str, Any]],
+                 on_data: Callable[[str, memoryview], None] = None,
+                 chunk_size: int = 65536,
+                 on_message: Callable[[str, message_header, memoryview],
+                                      None] = None,
+                 frame_messages: bool = False):
+        self.sockets = sockets
+        self.on_data = on_data
+        self.on_message = on_message
+        self.frame_messages = frame_messages or on_message is not None
+        # message_stream per registered socket, None once framing failed
+        self.streams = {}
+        # sockets unregistered after EOF or a read error
+        self.closed_by_peer = set()
+        # per socket: on_message of its current publisher and bytes received,
+        # a shared drain serves several publishers at once
+        self.socket_on_message = {}
+        self.socket_bytes = {}
+        self.parse_errors = 0
+        self.buffer = bytearray(chunk_size)
+        self.view = memoryview(self.buffer)
+        self.bytes_received = {socket['peer']: 0 for socket in sockets}
+        self.selector = selectors.DefaultSelector()
+        self.stop_event = threading.Event()
+        self.thread = None
+        # sockets added or removed while running, applied by the drain thread
+        self.pending = []
+        self.pending_lock = threading.Lock()
+
+    def start(self) -> None:
+        for socket_info in self.sockets:
+            self.register(socket_info)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def register(self, socket_info: Dict[str, Any]) -> None:
+        self.selector.register(socket_info['socket'], selectors.EVENT_READ,
+                               socket_info['peer'])
+        if self.frame_messages or socket_info.get('frame_messages'):
+            self.streams[socket_info['socket']] = message_stream()
+
+    def unregister(self, sock) -> None:
+        self.selector.unregister(sock)
+        self.streams.pop(sock, None)
+        self.socket_on_message.pop(sock, None)
+
+    def set_on_message(
+            self, sockets: List[Dict[str, Any]],
+            on_message: Callable[[str, message_header, memoryview],
+                                 None]) -> None:
+        # None clears the callback of these sockets only
+        for socket_info in sockets:
+            if on_message:
+                self.socket_on_message[socket_info['socket']] = on_message
+            else:
+                self.socket_on_message.pop(socket_info['socket'], None)
+
+    def is_alive(self, sock) -> bool:
+        # the drain thread is the only reader of its sockets, so it is the
+        # one that sees a connection closed or reset by the peer
+        return sock.fileno() != -1 and sock not in self.closed_by_peer
+
+    def add(self, socket_info: Dict[str, Any]) -> None:
+        self.bytes_received.setdefault(socket_info['peer'], 0)
+        with self.pending_lock:
+            self.pending.append(("add", socket_info))
+
+    def close(self, socket_info: Dict[str, Any]) -> None:
+        # unregistered and closed by the drain thread, so the fd can't be
+        # reused while it is still registered
+        with self.pending_lock:
+            self.pending.append(("close", socket_info))
+
+    def apply_pending(self) -> None:
+        with self.pending_lock:
+            pending, self.pending = self.pending, []
+        for action, socket_info in pending:
+            sock = socket_info['socket']
+            registered = any(key.fileobj is sock
+                             for key in self.selector.get_map().values())
+            if action == "add" and not registered and sock.fileno() != -1:
+                self.register(socket_info)
+            elif action == "close":
+                if registered:
+                    self.unregister(sock)
+                self.closed_by_peer.discard(sock)
+                self.socket_bytes.pop(sock, None)
+                sock.close()
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            self.apply_pending()
+            if not self.selector.get_map():
+                self.stop_event.wait(0.25)
+                continue
+            for key, _ in self.selector.select(timeout=0.25):
+                self.read(key)
+
+    def read(self, key: selectors.SelectorKey) -> None:
+        sock, peer = key.fileobj, key.data
+        try:
+            received = sock.recv_into(self.buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as msg:
+            print(f"Error reading from socket (peer: {peer}): {msg}")
+            self.unregister(sock)
+            self.closed_by_peer.add(sock)
+            return
+        if not received:
+            # peer closed the connection
+            self.unregister(sock)
+            self.closed_by_peer.add(sock)
+            return
+        self.bytes_received[peer] += received
+        self.socket_bytes[sock] = self.socket_bytes.get(sock, 0) + received
+        if self.on_data:
+            self.on_data(peer, self.view[:received])
+        if self.streams.get(sock) is not None:
+            self.parse(sock, peer, self.view[:received])
+
+    def parse(self, sock, peer: str, data: memoryview) -> None:
+        try:
+            for hdr, payload in self.streams[sock].feed(data):
+                # read once, may be reset by the publisher thread
+                on_message = self.socket_on_message.get(
+                    sock, self.on_message)
+                if on_message:
+                    on_message(peer, hdr, payload)
+        except ValueError as msg:
+            self.parse_errors += 1
+            print(f"Stop framing messages from {peer}: {msg}")
+            self.streams[sock] = None
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.apply_pending()
+        self.selector.close()
@@ -0,0 +1,65 @@
+from nanorpc.client import NanoRpcTyped
+from nanolab.src.utils import get_config_parser
+from typing import Any, Dict, List
+import asyncio
+import time
+
+
+class RoundGate:
+    """Flow control for round_gated publishing: after a round is sent, wait
+    until the cemented count of gate_node grew by the round's size (or
+    round_timeout_s passed) before the next round is sent."""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.node_name = params.get("gate_node", params.get("completion_node"))
+        self.timeout_s = float(params.get("round_timeout_s", 60))
+        self.interval_s = float(params.get("round_interval_s", 0.05))
+        self.nano_rpc = None
+        self.target_cemented = 0
+        self.rounds: List[Dict[str, Any]] = []
+
+    async def initialize(self) -> None:
+        conf_p = get_config_parser()
+        node_name = self.node_name if self.node_name else conf_p.get_nodes_name()[:-1]
+        self.nano_rpc = NanoRpcTyped(conf_p.get_node_rpc(node_name))
+        self.target_cemented = await self._cemented_count()
+
+    async def _cemented_count(self) -> int:
+        block_count = await self.nano_rpc.block_count()
+        return int(block_count["cemented"])
+
+    async def wait(self, round_size: int, round_start: float,
+                   sent_time: float) -> bool:
+        # round_start and sent_time are time.perf_counter() values
+        self.target_cemented += round_size
+        cemented = await self._cemented_count()
+        while cemented < self.target_cemented:
+            if time.perf_counter() - sent_time >= self.timeout_s:
+                break
+            await asyncio.sleep(self.interval_s)
+            cemented = await self._cemented_count()
+        cemented_time = time.perf_counter()
+
+        timeout = cemented < self.target_cemented
+        if timeout:
+            # the next round is measured from what was cemented so far
+            self.target_cemented = cemented
+        cement_s = cemented_time - round_start
+        self.rounds.append({
+            "round": len(self.rounds),
+            "blocks": round_size,
+            "send_s": sent_time - round_start,
+            "cement_s": cement_s,
+            "cps": round_size / cement_s if cement_s > 0 else 0,
+            "timeout": timeout
+        })
+        self.print_round(self.rounds[-1])
+        return not timeout
+
+    @staticmethod
+    def print_round(stats: Dict[str, Any]) -> None:
+        print(f"round {stats['round']} blocks: {stats['blocks']} "
+              f"send_s: {stats['send_s']:.3f} "
+              f"cement_s: {stats['cement_s']:.3f} "
+              f"cps: {stats['cps']:.0f}"
+              f"{' timeout' if stats['timeout'] else ''}")
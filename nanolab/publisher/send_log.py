@@ -0,0 +1,244 @@
+from nanorpc.client import NanoRpcTyped
+from nanolab.src.utils import get_config_parser
+from nanolab.publisher.block_corpus import FixedSizeRecords, HASH_SIZE
+from nanolab.publisher.confirmation_stats import percentile
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, List
+from array import array
+import asyncio
+import binascii
+import json
+import struct
+import time
+
+# Send log layout (little endian hosts):
+#   header      magic, version, record_count, hash_count, clock anchor,
+#               peers_length
+#   peers       utf-8 json list of peer names
+#   hashes      hash_count * 32 bytes, the published blocks in message order
+#   hash_index  record_count * u64, index into hashes
+#   peer_index  record_count * u16, index into peers
+#   send_ns     record_count * i64, time.monotonic_ns() after the send
+# The anchor pairs time.time_ns() with time.monotonic_ns() so send times can
+# be joined with wall clock confirmation times.
+SEND_LOG_MAGIC = b"NLSL"
+SEND_LOG_VERSION = 1
+SEND_LOG_HEADER = struct.Struct("<4sIQQqqI")
+
+
+class IndexedMessages(Sequence):
+    """Pairs every message with its index in the published selection, so
+    the publish strategies keep working while sends can be logged."""
+
+    def __init__(self, messages, base: int = 0, order: range = None):
+        self.messages = messages
+        self.base = base
+        self.order = order if order is not None else range(len(messages))
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return IndexedMessages(self.messages, self.base, self.order[idx])
+        pos = self.order[idx]
+        return self.base + pos, self.messages[pos]
+
+    def reverse(self):
+        self.order = self.order[::-1]
+
+
+class SendLog:
+    """Compact (hash index, peer, send time) records of every sent message."""
+
+    def __init__(self):
+        self.hash_index = array('Q')
+        self.peer_index = array('H')
+        self.send_ns = array('q')
+        self.peers: Dict[str, int] = {}
+        self.hashes: Sequence = []
+        self.anchor_wall_ns = time.time_ns()
+        self.anchor_monotonic_ns = time.monotonic_ns()
+
+    def record(self, index: int, peer: str, send_ns: int) -> None:
+        peer_index = self.peers.get(peer)
+        if peer_index is None:
+            peer_index = self.peers[peer] = len(self.peers)
+        self.hash_index.append(index)
+        self.peer_index.append(peer_index)
+        self.send_ns.append(send_ns)
+
+    def __len__(self):
+        return len(self.send_ns)
+
+    def wall_ns(self, monotonic_ns: int) -> int:
+        return self.anchor_wall_ns + monotonic_ns - self.anchor_monotonic_ns
+
+    def save(self, path: str, hashes: Iterable[str]) -> None:
+        peers_data = json.dumps(list(self.peers)).encode()
+        hashes_data = b"".join(binascii.unhexlify(h) for h in hashes)
+        with open(path, "wb") as f:
+            f.write(
+                SEND_LOG_HEADER.pack(SEND_LOG_MAGIC, SEND_LOG_VERSION,
+                                     len(self), len(hashes_data) // HASH_SIZE,
+                                     self.anchor_wall_ns,
+                                     self.anchor_monotonic_ns,
+                                     len(peers_data)))
+            f.write(peers_data)
+            f.write(hashes_data)
+            f.write(self.hash_index.tobytes())
+            f.write(self.peer_index.tobytes())
+            f.write(self.send_ns.tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "SendLog":
+        with open(path, "rb") as f:
+            data = memoryview(f.read())
+        (magic, version, record_count, hash_count, anchor_wall_ns,
+         anchor_monotonic_ns, peers_length) = SEND_LOG_HEADER.unpack_from(data)
+        if magic != SEND_LOG_MAGIC:
+            raise ValueError(f"{path} is not a send log")
+        if version != SEND_LOG_VERSION:
+            raise ValueError(f"Unsupported send log version: {version}")
+
+        send_log = cls()
+        send_log.anchor_wall_ns = anchor_wall_ns
+        send_log.anchor_monotonic_ns = anchor_monotonic_ns
+        offset = SEND_LOG_HEADER.size
+        peers = json.loads(bytes(data[offset:offset + peers_length]))
+        send_log.peers = {peer: i for i, peer in enumerate(peers)}
+        offset += peers_length
+        send_log.hashes = FixedSizeRecords(
+            data[offset:offset + hash_count * HASH_SIZE], HASH_SIZE,
+            as_hex=True)
+        offset += hash_count * HASH_SIZE
+        for column in (send_log.hash_index, send_log.peer_index,
+                       send_log.send_ns):
+            size = record_count * column.itemsize
+            column.frombytes(data[offset:offset + size])
+            offset += size
+        return send_log
+
+
+def confirmation_latency(send_logs: List[SendLog],
+                         confirmed_at: Dict[str, int]) -> Dict[str, Any]:
+    """Joins send logs with wall clock confirmation times (ns by hash).
+    Latency is measured from the first time a block left any socket."""
+    first_sent = {}
+    for send_log in send_logs:
+        for index, send_ns in zip(send_log.hash_index, send_log.send_ns):
+            block_hash = send_log.hashes[index]
+            sent = send_log.wall_ns(send_ns)
+            if sent < first_sent.get(block_hash, sent + 1):
+                first_sent[block_hash] = sent
+
+    latencies = sorted((confirmed_at[block_hash] - sent) / 1e9
+                       for block_hash, sent in first_sent.items()
+                       if block_hash in confirmed_at)
+    stats = {
+        "sent_blocks": len(first_sent),
+        "confs": len(latencies),
+        "unconfirmed": len(first_sent) - len(latencies)
+    }
+    if not latencies:
+        return stats
+    stats.update({
+        "min_conf_s": latencies[0],
+        "max_conf_s": latencies[-1],
+        "perc_50_s": percentile(latencies, 50),
+        "perc_75_s": percentile(latencies, 75),
+        "perc_90_s": percentile(latencies, 90),
+        "perc_99_s": percentile(latencies, 99)
+    })
+    return stats
+
+
+class ConfirmationTracker:
+    """Polls blocks_info for the published hashes while publishing and keeps
+    the wall clock time each block was first seen confirmed. The resolution
+    is one poll of all pending hashes.
+
+    When it follows the publisher's send log, only hashes already sent are
+    polled. Polls are spaced by confirmation_interval_s and at most
+    confirmation_rps blocks_info requests per second go to the node."""
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, params: Dict[str, Any]):
+        self.node_name = params.get("completion_node")
+        self.interval_s = float(params.get("confirmation_interval_s", 0.1))
+        self.timeout_s = float(params.get("confirmation_timeout_s", 60))
+        self.max_rps = float(params.get("confirmation_rps", 10))
+        if self.max_rps <= 0:
+            raise ValueError(f"Invalid confirmation_rps: {self.max_rps}")
+        self.confirmed_at: Dict[str, int] = {}
+        self.pending = {}
+        # pending hashes seen in the followed send log, in send order
+        self.sent = {}
+        self.send_log = None
+        self.send_log_hashes: Sequence = []
+        self.followed = 0
+        self.nano_rpc = None
+        self.task = None
+
+    async def start(self, hashes: Iterable[str]) -> None:
+        conf_p = get_config_parser()
+        node_name = self.node_name if self.node_name else conf_p.get_nodes_name()[:-1]
+        self.nano_rpc = NanoRpcTyped(conf_p.get_node_rpc(node_name))
+        self.pending = dict.fromkeys(h.upper() for h in hashes)
+        self.task = asyncio.create_task(self.run())
+
+    def follow(self, send_log: SendLog, hashes: Sequence) -> None:
+        # `hashes` are the ones send_log's hash indexes refer to, they may
+        # still grow while publishing
+        self.send_log = send_log
+        self.send_log_hashes = hashes
+        self.followed = 0
+
+    def poll_hashes(self) -> List[str]:
+        if self.send_log is None:
+            return list(self.pending)
+        hash_index = self.send_log.hash_index
+        for index in hash_index[self.followed:]:
+            block_hash = self.send_log_hashes[index].upper()
+            if block_hash in self.pending:
+                self.sent[block_hash] = None
+        self.followed = len(hash_index)
+        return list(self.sent)
+
+    async def poll(self) -> int:
+        # returns the number of blocks_info requests sent
+        block_hashes = self.poll_hashes()
+        for start in range(0, len(block_hashes), self.BATCH_SIZE):
+            res = await self.nano_rpc.blocks_info(
+                block_hashes[start:start + self.BATCH_SIZE],
+                include_not_found="true")
+            now = time.time_ns()
+            for block_hash, info in res.get("blocks", {}).items():
+                if info.get("confirmed") == "true":
+                    self.confirmed_at[block_hash.upper()] = now
+                    self.pending.pop(block_hash.upper(), None)
+                    self.sent.pop(block_hash.upper(), None)
+        return (len(block_hashes) + self.BATCH_SIZE - 1) // self.BATCH_SIZE
+
+    async def run(self) -> None:
+        while self.pending:
+            requests = 0
+            try:
+                requests = await self.poll()
+            except Exception as e:
+                print(f"Error polling confirmations: {str(e)}")
+            await asyncio.sleep(max(self.interval_s, requests / self.max_rps))
+
+    async def finish(self) -> bool:
+        # waits for the remaining confirmations after publishing
+        try:
+            await asyncio.wait_for(self.task, self.timeout_s)
+        except asyncio.TimeoutError:
+            print(f"{len(self.pending)} blocks not confirmed after {self.timeout_s}s")
+            return False
+        return True
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.confirmed_at, f)
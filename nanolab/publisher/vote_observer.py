@@ -0,0 +1,122 @@
+from nanolab.xnomin.peers import message_header, message_type_enum, block_type_enum
+from nanolab.xnomin.acctools import account_key
+from typing import Any, Dict, Iterable
+from array import array
+import asyncio
+import binascii
+import time
+
+# vote: account, signature, timestamp, then the voted hashes
+VOTE_HASHES_OFFSET = 32 + 64 + 8
+FINAL_VOTE_TIMESTAMP = b"\xff" * 8
+
+
+class VoteObserver:
+    """Confirmation latency from the confirm_ack votes the nodes send on the
+    realtime sockets, without polling RPC.
+
+    Records per published block the time of its first vote and, when rep
+    weights are given (vote_weights: {account: weight}), the time final
+    votes reached the quorum weight. Only votes relayed to the publisher's
+    sockets are seen, blocks without one are reported unconfirmed."""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.timeout_s = float(params.get("vote_timeout_s", 60))
+        self.interval_s = float(params.get("vote_interval_s", 0.1))
+        self.weights = {
+            account_key(account): int(weight)
+            for account, weight in params.get("vote_weights", {}).items()
+        }
+        quorum_percent = float(params.get("vote_quorum_percent", 67))
+        self.quorum = int(
+            params.get("vote_quorum",
+                       sum(self.weights.values()) * quorum_percent / 100))
+        self.index: Dict[bytes, int] = {}
+        self.hashes = []
+        # time.monotonic_ns() per block, 0 until seen
+        self.first_vote_ns = array('q')
+        self.quorum_ns = array('q')
+        # final vote weight per block and its voters, until quorum
+        self.tally: Dict[int, Dict[bytes, int]] = {}
+        self.pending_votes = 0
+        self.pending_quorum = 0
+        self.votes = 0
+        self.anchor_wall_ns = time.time_ns()
+        self.anchor_monotonic_ns = time.monotonic_ns()
+
+    def start(self, hashes: Iterable[str]) -> None:
+        self.hashes = [h.upper() for h in hashes]
+        self.index = {
+            binascii.unhexlify(h): pos
+            for pos, h in enumerate(self.hashes)
+        }
+        self.first_vote_ns = array('q', [0]) * len(self.hashes)
+        self.quorum_ns = array('q', [0]) * len(self.hashes)
+        self.pending_votes = len(self.hashes)
+        self.pending_quorum = len(self.hashes) if self.weights else 0
+
+    def on_message(self, peer: str, hdr: message_header,
+                   payload: memoryview) -> None:
+        # called by the drain thread for every inbound message
+        if (hdr.msg_type.type != message_type_enum.confirm_ack
+                or hdr.block_type() != block_type_enum.not_a_block):
+            return
+        now = time.monotonic_ns()
+        vote = payload.tobytes()
+        self.votes += 1
+        account = vote[:32]
+        weight = self.weights.get(account, 0)
+        final = vote[96:104] == FINAL_VOTE_TIMESTAMP
+        for offset in range(VOTE_HASHES_OFFSET, len(vote), 32):
+            pos = self.index.get(vote[offset:offset + 32])
+            if pos is None:
+                continue
+            if not self.first_vote_ns[pos]:
+                self.first_vote_ns[pos] = now
+                self.pending_votes -= 1
+            if final and weight and not self.quorum_ns[pos]:
+                self.add_weight(pos, account, weight, now)
+
+    def add_weight(self, pos: int, account: bytes, weight: int,
+                   now: int) -> None:
+        voters = self.tally.setdefault(pos, {})
+        voters[account] = weight
+        if sum(voters.values()) >= self.quorum:
+            self.quorum_ns[pos] = now
+            self.pending_quorum -= 1
+            del self.tally[pos]
+
+    def done(self) -> bool:
+        return self.pending_votes == 0 and self.pending_quorum == 0
+
+    async def wait(self) -> bool:
+        # keeps the sockets open after publishing until every block was seen
+        start_time = time.perf_counter()
+        while not self.done():
+            if time.perf_counter() - start_time >= self.timeout_s:
+                print(f"{self.pending_votes} blocks without vote, "
+                      f"{self.pending_quorum} without quorum "
+                      f"after {self.timeout_s}s")
+                return False
+            await asyncio.sleep(self.interval_s)
+        return True
+
+    def wall_ns(self, monotonic_ns: int) -> int:
+        return self.anchor_wall_ns + monotonic_ns - self.anchor_monotonic_ns
+
+    def voted_at(self, quorum: bool = False) -> Dict[str, int]:
+        # wall clock ns by hash, the format confirmation_latency joins on
+        times = self.quorum_ns if quorum else self.first_vote_ns
+        return {
+            block_hash: self.wall_ns(times[pos])
+            for pos, block_hash in enumerate(self.hashes) if times[pos]
+        }
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "votes": self.votes,
+            "blocks": len(self.hashes),
+            "first_vote": len(self.hashes) - self.pending_votes,
+            "quorum": len(self.hashes) - self.pending_quorum
+            if self.weights else 0
+        }
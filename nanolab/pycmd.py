@@ -1,7 +1,10 @@
 import time
+import json
 import nanolab.node_interaction as nni
 import asyncio
 from nanolab.publisher.test_case import TestCaseFactory
+from nanolab.publisher.block_corpus import convert_json_corpus
+from nanolab.publisher.connection_pool import close_connection_pool
 
 
 class TestClass:
@@ -37,8 +40,46 @@ class NodeInteraction:
     def publish_blocks(self, publish_params):
         '''
         mandatory publish_params: blocks_path, bps
-         optional publish_params: peers, split, split_skip, reverse, shuffle, 
-                  start_round, end_round, subset.start_index, subset.end_index
+         optional publish_params: peers, split, split_skip, split_by_account,
+                  reverse, shuffle, shuffle_seed,
+                  start_round, end_round, subset.start_index, subset.end_index,
+                  preserialise, transport, load_profile, batch_size,
+                  processes, completion, completion_timeout_s,
+                  completion_interval_s, completion_node, stream,
+                  reuse_connections,
+                  handshake_concurrency, handshake_retries,
+                  handshake_backoff_s, connect_timeout_s,
+                  handshake_timeout_s, channels_per_peer,
+                  send_log_path, confirmation_interval_s,
+                  confirmation_timeout_s, confirmation_rps,
+                  metrics_interval_s,
+                  round_gated, gate_node, round_timeout_s, round_interval_s,
+                  dependency_order, parse_inbound, observe_votes,
+                  vote_weights, vote_quorum, vote_quorum_percent,
+                  vote_timeout_s, vote_interval_s
+         returns the throughput stats (one dict per worker with processes > 1)
          '''
 
-        asyncio.run(nni.xnolib_publish(publish_params))
+        return asyncio.run(nni.xnolib_publish(publish_params))
+
+    def close_connections(self):
+        '''
+        closes the realtime connections kept open by publish_blocks
+        '''
+        close_connection_pool()
+
+    def convert_blocks(self, blocks_path, corpus_path):
+        '''
+        converts a json block corpus into the binary corpus format,
+        publish_blocks accepts both formats as blocks_path
+        '''
+        print(convert_json_corpus(blocks_path, corpus_path))
+
+    def confirmation_latency(self, send_log_paths, confirmations_path):
+        '''
+        joins send logs of publish_blocks (send_log_path) with the
+        confirmation times saved next to them and prints latency percentiles
+        '''
+        with open(confirmations_path) as f:
+            confirmed_at = json.load(f)
+        return nni.print_confirmation_latency(send_log_paths, confirmed_at)
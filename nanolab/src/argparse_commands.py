@@ -8,6 +8,7 @@ from nanomock.modules.nl_parse_config import ConfigReadWrite
 from nanolab.src.utils import extract_packaged_data_to_disk
 from nanolab.src.config_loader import ConfigLoader, ConfigValidator, ConfigCommandExecutor
 from nanolab.src.snippet_manager import SnippetManager
+from nanolab.publisher.block_corpus import convert_json_corpus
 
 
 def parse_args():
@@ -48,6 +49,13 @@ def parse_args():
     list_parser.add_argument('--refs', action='store_true',
                              help="List all available branches'")
     
+    # Convert command
+    convert_parser = subparsers.add_parser(
+        "convert", help="Convert a json block corpus into the binary format")
+    convert_parser.add_argument('-i', '--input', type=str, required=True,
+                                help='Path to the json block corpus')
+    convert_parser.add_argument('-o', '--output', type=str, required=True,
+                                help='Path of the binary block corpus to write')
 
     return parser.parse_args()
 
@@ -57,8 +65,9 @@ class ArgParseHandler:
     def __init__(self, args=None):
         self.args = args or parse_args()
         self.conf_rw = ConfigReadWrite()
-        self.github_api = GitHubAPI(self.args.gh_user, self.args.gh_repo,
-                                    self.args.gh_path,  self.args.gh_ref)
+        if self.args.command in ("run", "list"):
+            self.github_api = GitHubAPI(self.args.gh_user, self.args.gh_repo,
+                                        self.args.gh_path,  self.args.gh_ref)
 
     def run(self):
         path_handler = ConfigPathHandler(self.args.testcase)
@@ -122,5 +131,9 @@ class ArgParseHandler:
                     if file["name"].endswith(".json"):
                         print(file["name"][:-5])
 
+    def convert_blocks(self):
+        res = convert_json_corpus(self.args.input, self.args.output)
+        print(f"Converted {res['blocks']} blocks in {res['rounds']} rounds to {self.args.output}")
+
     def get_args(self):
         return self.args
@@ -0,0 +1,113 @@
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class JsonStreamReader:
+    """Incremental reader for a JSON document that is too large to load.
+
+    Only the structure around arrays is walked by hand, every element is
+    decoded with json's raw_decode once it is completely buffered.
+    """
+
+    def __init__(self, fp: TextIO, chunk_size: int = 1 << 20):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read(self) -> None:
+        # drop consumed data, read at least as much as is buffered so that
+        # retries on large values stay linear
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        chunk = self.fp.read(max(self.chunk_size, len(self.buffer)))
+        if not chunk:
+            self.eof = True
+        self.buffer += chunk
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._read()
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at position {self.pos} of json stream")
+        self.pos += 1
+
+    def decode(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._read()
+                continue
+            if end == len(self.buffer) and not self.eof:
+                # a number could continue in the next chunk
+                self._read()
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self) -> Iterator[Any]:
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            if self.peek() == ']':
+                self.pos += 1
+                return
+            self.expect(',')
+
+    def skip_value(self) -> None:
+        if self.peek() == '[':
+            # walk arrays element by element to keep memory bounded
+            for _ in self.iter_array():
+                pass
+        else:
+            self.decode()
+
+    def iter_member_array(
+            self,
+            key: str,
+            collect: Optional[Dict[str, Callable[[Any], None]]] = None
+    ) -> Iterator[Any]:
+        # elements of the member arrays in `collect` that precede `key` are
+        # handed to their callable on the way instead of being skipped
+        self.expect('{')
+        while self.peek() not in ('}', ''):
+            member = self.decode()
+            self.expect(':')
+            if member == key:
+                yield from self.iter_array()
+                return
+            if collect is not None and member in collect:
+                for element in self.iter_array():
+                    collect[member](element)
+            else:
+                self.skip_value()
+            if self.peek() == ',':
+                self.pos += 1
+        raise KeyError(key)
+
+
+def iter_json_array(
+        path: str,
+        key: str,
+        collect: Optional[Dict[str, Callable[[Any], None]]] = None
+) -> Iterator[Any]:
+    # yields the elements of the top level array `key` one at a time
+    with open(path, encoding="utf-8") as fp:
+        yield from JsonStreamReader(fp).iter_member_array(key, collect)
@@ -0,0 +1,51 @@
+from collections.abc import Sequence
+import random
+
+MASK_64 = (1 << 64) - 1
+
+
+class IndexPermutation(Sequence):
+    """Seeded pseudo random permutation of range(size), evaluated lazily.
+
+    A balanced Feistel network permutes the smallest even-bit domain that
+    holds `size`; indices outside of range(size) are walked through the
+    network again until they fall inside (cycle walking). Memory use is
+    constant and the same seed always yields the same order.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, seed, order: range = None):
+        self.size = size
+        self.seed = seed
+        half_bits = max((size - 1).bit_length() + 1, 2) // 2
+        self.half_bits = half_bits
+        self.half_mask = (1 << half_bits) - 1
+        rng = random.Random(str(seed))
+        self.keys = [rng.getrandbits(64) for _ in range(self.ROUNDS)]
+        self.order = order if order is not None else range(size)
+
+    def _round(self, value: int, key: int) -> int:
+        value = ((value ^ key) * 0x9E3779B97F4A7C15) & MASK_64
+        value ^= value >> 29
+        return value & self.half_mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.half_mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self.half_bits) | right
+
+    def permute(self, index: int) -> int:
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return IndexPermutation(self.size, self.seed, self.order[idx])
+        return self.permute(self.order[idx])
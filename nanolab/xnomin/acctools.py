@@ -1,14 +1,21 @@
 import base64
 import hashlib
+from functools import lru_cache
+
+RFC_3548 = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+ENCODING = b"13456789abcdefghijkmnopqrstuwxyz"
+# translation tables are built once instead of on every call
+_ENCODE_TABLE = bytes.maketrans(RFC_3548, ENCODING)
+_DECODE_TABLE = bytes.maketrans(ENCODING, base64._b32alphabet)
+
+# corpora reuse the same representatives and destinations over and over
+ACCOUNT_CACHE_SIZE = 1 << 16
 
 
 # this function expects account to be a 32 byte bytearray
 def to_account_addr(account: bytes, prefix: str = 'nano_') -> str:
     assert (len(account) == 32)
 
-    RFC_3548 = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
-    ENCODING = b"13456789abcdefghijkmnopqrstuwxyz"
-
     h = hashlib.blake2b(digest_size=5)
     h.update(account)
     checksum = h.digest()
@@ -20,8 +27,7 @@ def to_account_addr(account: bytes, prefix: str = 'nano_') -> str:
     encode_account = base64.b32encode(account2)
 
     # simply translate the result from RFC3548 to Nano's encoding, snip off the leading useless bytes
-    encode_account = encode_account.translate(
-        bytes.maketrans(RFC_3548, ENCODING))[4:]
+    encode_account = encode_account.translate(_ENCODE_TABLE)[4:]
 
     # add prefix, label and return
     return prefix + encode_account.decode()
@@ -35,12 +41,11 @@ def account_key(account: str) -> bytes:
     :raise AssertionError: for invalid account
     """
     account_prefix = "nano_"
-    _B32 = b"13456789abcdefghijkmnopqrstuwxyz"
     assert (len(account) == len(account_prefix) + 60
             and account[:len(account_prefix)] == account_prefix)
 
     account = b"1111" + account[-60:].encode()
-    account = account.translate(bytes.maketrans(_B32, base64._b32alphabet))
+    account = account.translate(_DECODE_TABLE)
     key = base64.b32decode(account)
 
     checksum = key[:-6:-1]
@@ -48,4 +53,29 @@ def account_key(account: str) -> bytes:
 
     assert hashlib.blake2b(key, digest_size=5).digest() == checksum
 
-    return key
\ No newline at end of file
+    return key
+
+
+# memoized variants, the arguments must be hashable (bytes, not bytearray)
+cached_account_key = lru_cache(maxsize=ACCOUNT_CACHE_SIZE)(account_key)
+cached_to_account_addr = lru_cache(maxsize=ACCOUNT_CACHE_SIZE)(to_account_addr)
+
+
+def account_cache_stats() -> dict:
+    stats = {}
+    for name, func in (("account_key", cached_account_key),
+                       ("to_account_addr", cached_to_account_addr)):
+        info = func.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_rate": info.hits / lookups if lookups else 0,
+            "size": info.currsize
+        }
+    return stats
+
+
+def account_cache_clear() -> None:
+    cached_account_key.cache_clear()
+    cached_to_account_addr.cache_clear()
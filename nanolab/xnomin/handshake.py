@@ -1,6 +1,7 @@
 from nanolab.xnomin.peers import message_header, py_ed25519_blake2b, socket, hexlify, message_type
 from secrets import token_bytes
 from typing import Tuple
+import asyncio
 import time
 
 
@@ -23,6 +24,21 @@ def read_socket(sock: socket.socket, byte_count: int, timeout: float = 30.0) ->
         return None
 
 
+async def read_socket_async(sock: socket.socket, byte_count: int) -> bytes:
+    # exact read into one buffer on a non-blocking socket
+    loop = asyncio.get_running_loop()
+    data = bytearray(byte_count)
+    view = memoryview(data)
+    received = 0
+    while received < byte_count:
+        chunk = await loop.sock_recv_into(sock, view[received:])
+        if not chunk:
+            raise ValueError('SocketClosedByPeer read_socket_async: data=%s' %
+                             hexlify(data[:received]))
+        received += chunk
+    return bytes(data)
+
+
 class node_handshake_id:
 
     @classmethod
@@ -42,22 +58,38 @@ class node_handshake_id:
     ) -> Tuple[py_ed25519_blake2b.SigningKey, py_ed25519_blake2b.VerifyingKey]:
         return py_ed25519_blake2b.create_keypair()
 
+    # header and the node's handshake_response_query
+    RESPONSE_QUERY_SIZE = 136
+
+    @classmethod
+    def create_query(cls, ctx: dict) -> "handshake_query":
+        hdr = message_header(ctx['net_id'], [21, 21, 20], message_type(10), 1)
+        return handshake_query(hdr, token_bytes(32))
+
+    @classmethod
+    def answer_response_query(
+        cls, ctx: dict, data: bytes,
+        signing_key: py_ed25519_blake2b.SigningKey,
+        verifying_key: py_ed25519_blake2b.VerifyingKey
+    ) -> Tuple["handshake_response_query", "handshake_response"]:
+        # parses the node's reply to our query and signs its cookie
+        hdr = message_header.parse_header(data[0:8])
+        recvd_response = handshake_response_query.parse_query_response(
+            hdr, data[8:])
+        response = handshake_response.create_response(
+            ctx, recvd_response.cookie, signing_key, verifying_key)
+        return recvd_response, response
+
     @classmethod
     def perform_handshake_exchange(
             cls, ctx: dict, s: socket.socket,
             signing_key: py_ed25519_blake2b.SigningKey,
             verifying_key: py_ed25519_blake2b.VerifyingKey) -> bytes:
-        hdr = message_header(ctx['net_id'], [21, 21, 20], message_type(10), 1)
-        msg_handshake = handshake_query(hdr)
-        s.sendall(msg_handshake.serialise())
+        s.sendall(cls.create_query(ctx).serialise())
         try:
-            data = read_socket(s, 136)
-            hdr = message_header.parse_header(data[0:8])
-            recvd_response = handshake_response_query.parse_query_response(
-                hdr, data[8:])
-
-            response = handshake_response.create_response(
-                ctx, recvd_response.cookie, signing_key, verifying_key)
+            data = read_socket(s, cls.RESPONSE_QUERY_SIZE)
+            recvd_response, response = cls.answer_response_query(
+                ctx, data, signing_key, verifying_key)
             s.sendall(response.serialise())
 
             # vk = py_ed25519_blake2b.keys.VerifyingKey(recvd_response.account)
@@ -67,6 +99,22 @@ class node_handshake_id:
 
         return recvd_response.account
 
+    @classmethod
+    async def perform_handshake_exchange_async(
+            cls, ctx: dict, s: socket.socket,
+            signing_key: py_ed25519_blake2b.SigningKey,
+            verifying_key: py_ed25519_blake2b.VerifyingKey) -> bytes:
+        # same exchange on a non-blocking socket, timeouts are up to the caller
+        loop = asyncio.get_running_loop()
+        await loop.sock_sendall(s, cls.create_query(ctx).serialise())
+
+        data = await read_socket_async(s, cls.RESPONSE_QUERY_SIZE)
+        recvd_response, response = cls.answer_response_query(
+            ctx, data, signing_key, verifying_key)
+        await loop.sock_sendall(s, response.serialise())
+
+        return recvd_response.account
+
 
 class handshake_response_query(node_handshake_id):
 
@@ -0,0 +1,75 @@
+from nanolab.xnomin.peers import message_header, frozen_message_header
+from typing import Iterator, Tuple
+
+HEADER_SIZE = 8
+
+
+class message_stream:
+    """Incremental framing of one realtime connection.
+
+    feed() takes recv chunks of any size and returns the complete messages
+    as (header, payload): the header is a shared frozen_message_header, the
+    payload a memoryview into the stream's buffer. The buffer is reused
+    across chunks, only the tail of an incomplete message is moved to its
+    front. A payload is only valid until the next call of feed().
+
+    Raises ValueError for bytes that can't be framed (bad magic, network id
+    or message type, or a type without known payload length); the stream
+    can't be resynchronised after that and has to be discarded.
+    """
+
+    def __init__(self, buffer_size: int = 65536):
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        # header parsed from the buffer whose payload is incomplete
+        self.pending_hdr = None
+        self.messages = 0
+
+    def feed(self, data) -> Iterator[Tuple[message_header, memoryview]]:
+        self._append(data)
+        return self._frames()
+
+    def _append(self, data) -> None:
+        size = len(data)
+        if self.start == self.end:
+            self.start = self.end = 0
+        if self.end + size > len(self.buffer):
+            tail = self.end - self.start
+            if tail + size > len(self.buffer):
+                # grow into a new buffer, payloads handed out before stay valid
+                buffer = bytearray(max(2 * len(self.buffer), tail + size))
+                buffer[:tail] = self.view[self.start:self.end]
+                self.buffer = buffer
+                self.view = memoryview(buffer)
+            else:
+                self.view[:tail] = bytes(self.view[self.start:self.end])
+            self.start, self.end = 0, tail
+        self.view[self.end:self.end + size] = data
+        self.end += size
+
+    def _frames(self) -> Iterator[Tuple[message_header, memoryview]]:
+        while True:
+            hdr = self.pending_hdr
+            if hdr is None:
+                if self.end - self.start < HEADER_SIZE:
+                    return
+                hdr = frozen_message_header.parse_header(
+                    bytes(self.view[self.start:self.start + HEADER_SIZE]))
+                self.start += HEADER_SIZE
+            payload_size = hdr.payload_length_bytes()
+            if payload_size is None:
+                raise ValueError(
+                    f"ParseErrorUnknownPayloadLength: {hdr.msg_type}")
+            if self.end - self.start < payload_size:
+                self.pending_hdr = hdr
+                return
+            self.pending_hdr = None
+            payload = self.view[self.start:self.start + payload_size]
+            self.start += payload_size
+            self.messages += 1
+            yield hdr, payload
+
+    def buffered(self) -> int:
+        return self.end - self.start
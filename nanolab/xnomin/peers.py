@@ -7,8 +7,10 @@ import binascii
 from hashlib import blake2b
 import py_ed25519_blake2b
 import json
+import struct
 import requests
-from nanolab.xnomin.acctools import to_account_addr, account_key
+from functools import lru_cache
+from nanolab.xnomin.acctools import cached_account_key, cached_to_account_addr
 
 
 def get_peers_from_service(ctx: dict, url=None):
@@ -82,6 +84,8 @@ class message_type_enum:
     bulk_pull_account = 0x0b
     telemetry_req = 0x0c
     telemetry_ack = 0x0d
+    asc_pull_req = 0x0e
+    asc_pull_ack = 0x0f
 
 
 def message_type_enum_to_str(msg_type: int):
@@ -91,6 +95,8 @@ def message_type_enum_to_str(msg_type: int):
 
 def block_length_by_type(blktype: int) -> int:
     lengths = {2: 152, 3: 136, 4: 168, 5: 136, 6: 216}
+    if blktype not in lengths:
+        raise ValueError(f"Unknown block type: {blktype}")
     return lengths[blktype]
 
 
@@ -103,6 +109,27 @@ def node_id_handshake_size(is_query: bool, is_response: bool) -> int:
     return size
 
 
+def confirm_ack_size(block_type: int, count: int) -> int:
+    # vote: account, signature, timestamp followed by the voted hashes,
+    # votes of older nodes carry a single block instead
+    size = 32 + 64 + 8
+    if block_type == block_type_enum.not_a_block:
+        return size + 32 * count
+    return size + block_length_by_type(block_type)
+
+
+def asc_pull_size(ext: int) -> int:
+    # type and id, followed by a payload whose length is the extensions field
+    return 1 + 8 + ext
+
+
+def confirm_req_size(block_type: int, count: int) -> int:
+    # (hash, root) pairs, requests of older nodes carry a single block
+    if block_type == block_type_enum.not_a_block:
+        return (32 + 32) * count
+    return block_length_by_type(block_type)
+
+
 class network_id:
 
     def __init__(self, rawbyte: int):
@@ -127,7 +154,7 @@ class network_id:
 class message_type:
 
     def __init__(self, num: int) -> None:
-        if not (num in range(0, 14)):
+        if not (num in range(0, 16)):
             raise ValueError("ParseErrorBadMessageType")
         self.type = num
 
@@ -142,6 +169,11 @@ class message_type:
 
 class message_header:
 
+    # magic 'R', network id, version max / using / min, message type,
+    # extensions (little endian)
+    CODEC = struct.Struct("<6BH")
+    MAGIC = ord('R')
+
     def __init__(self, net_id: network_id, versions: List[int],
                  msg_type: message_type, ext: int):
         self.ext = ext
@@ -153,15 +185,16 @@ class message_header:
         assert isinstance(self.msg_type, message_type)
 
     def serialise_header(self) -> bytes:
-        header = b""
-        header += ord('R').to_bytes(1, "big")
-        header += ord(str(self.net_id)).to_bytes(1, "big")
-        header += self.ver_max.to_bytes(1, "big")
-        header += self.ver_using.to_bytes(1, "big")
-        header += self.ver_min.to_bytes(1, "big")
-        header += self.msg_type.type.to_bytes(1, "big")
-        header += self.ext.to_bytes(2, "little")
-        return header
+        return self.CODEC.pack(self.MAGIC, *self.fields())
+
+    def fields(self) -> tuple:
+        return (self.net_id.id, self.ver_max, self.ver_using, self.ver_min,
+                self.msg_type.type, self.ext)
+
+    def freeze(self) -> "frozen_message_header":
+        return frozen_message_header(
+            self.net_id, [self.ver_max, self.ver_using, self.ver_min],
+            self.msg_type, self.ext)
 
     def is_query(self) -> bool:
         return self.ext & 1
@@ -185,6 +218,18 @@ class message_header:
         COUNT_MASK = 0xf000
         return (self.ext & COUNT_MASK) >> 12
 
+    def confirm_is_v2(self) -> bool:
+        # confirm_ack / confirm_req of V25+ nodes, count up to 255
+        return self.ext & 1
+
+    def count_v2_get(self) -> int:
+        return ((self.ext & 0xf000) >> 8) | ((self.ext & 0x00f0) >> 4)
+
+    def confirm_count(self) -> int:
+        if self.confirm_is_v2():
+            return self.count_v2_get()
+        return self.count_get()
+
     def block_type(self) -> int:
         BLOCK_TYPE_MASK = 0x0f00
         return (self.ext & BLOCK_TYPE_MASK) >> 8
@@ -224,48 +269,52 @@ class message_header:
             message_type(json_hdr['msg_type']), json_hdr['ext'])
 
     def payload_length_bytes(self) -> Optional[int]:
-        if self.msg_type == message_type(message_type_enum.bulk_pull):
+        msg_type = self.msg_type.type
+        if msg_type == message_type_enum.bulk_pull:
             return None
 
-        if self.msg_type == message_type(message_type_enum.bulk_push):
+        if msg_type == message_type_enum.bulk_push:
             return 0
 
-        elif self.msg_type == message_type(message_type_enum.telemetry_req):
+        elif msg_type == message_type_enum.telemetry_req:
             return 0
 
-        elif self.msg_type == message_type(message_type_enum.frontier_req):
+        elif msg_type == message_type_enum.frontier_req:
             return 32 + 4 + 4
 
-        elif self.msg_type == message_type(
-                message_type_enum.bulk_pull_account):
+        elif msg_type == message_type_enum.bulk_pull_account:
             return 32 + 16 + 1
 
-        elif self.msg_type == message_type(message_type_enum.keepalive):
+        elif msg_type == message_type_enum.keepalive:
             return 8 * (16 + 2)
 
-        elif self.msg_type == message_type(message_type_enum.publish):
+        elif msg_type == message_type_enum.publish:
             return block_length_by_type(self.block_type())
 
-        # elif self.msg_type == message_type(message_type_enum.confirm_ack):
-        #     return confirm_ack_size(self.block_type(), self.count_get())
+        elif msg_type == message_type_enum.confirm_ack:
+            return confirm_ack_size(self.block_type(), self.confirm_count())
 
-        # elif self.msg_type == message_type(message_type_enum.confirm_req):
-        #     return confirm_req_size(self.block_type(), self.count_get())
+        elif msg_type == message_type_enum.confirm_req:
+            return confirm_req_size(self.block_type(), self.confirm_count())
 
-        elif self.msg_type == message_type(
-                message_type_enum.node_id_handshake):
+        elif msg_type == message_type_enum.node_id_handshake:
             return node_id_handshake_size(self.is_query(), self.is_response())
 
-        elif self.msg_type == message_type(message_type_enum.telemetry_ack):
+        elif msg_type == message_type_enum.telemetry_ack:
             return self.telemetry_ack_size()
 
+        elif msg_type in (message_type_enum.asc_pull_req,
+                          message_type_enum.asc_pull_ack):
+            return asc_pull_size(self.ext)
+
         else:
             logger.debug(f"Unknown message type: {self.msg_type}")
             return None
 
     def __eq__(self, other):
-        if str(self) == str(other):
-            return True
+        if not isinstance(other, message_header):
+            return False
+        return self.fields() == other.fields()
 
     def __str__(self):
         str = "NetID: %s, " % self.net_id
@@ -276,8 +325,57 @@ class message_header:
         return str
 
 
+class frozen_message_header(message_header):
+    """Immutable message_header, its serialised bytes are computed once.
+    Used where one header is shared by many messages (every publish
+    message) or the same header bytes are parsed over and over."""
+
+    def __init__(self, net_id: network_id, versions: List[int],
+                 msg_type: message_type, ext: int):
+        super().__init__(net_id, versions, msg_type, ext)
+        self._fields = super().fields()
+        self._serialised = super().serialise_header()
+        self._hash = hash(self._fields)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"frozen_message_header: can't set {name}")
+        super().__setattr__(name, value)
+
+    def serialise_header(self) -> bytes:
+        return self._serialised
+
+    def fields(self) -> tuple:
+        return self._fields
+
+    def freeze(self) -> "frozen_message_header":
+        return self
+
+    def __hash__(self):
+        return self._hash
+
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def parse_header(cls, data: bytes):
+        # realtime traffic repeats a few distinct headers, parse each once
+        hdr = message_header.parse_header(data)
+        return frozen_message_header(hdr.net_id,
+                                     [hdr.ver_max, hdr.ver_using, hdr.ver_min],
+                                     hdr.msg_type, hdr.ext)
+
+
 class block_state:
 
+    # account, previous, representative, balance (128 bit as 2 x u64), link,
+    # signature, work; all big endian
+    CODEC = struct.Struct(">32s32s32sQQ32s64sQ")
+    HASH_PREAMBLE = (b'\x00' * 31) + b'\x06'
+    U64_MASK = (1 << 64) - 1
+
+    __slots__ = ("account", "previous", "representative", "balance", "link",
+                 "signature", "work", "_ancillary")
+
     def __init__(self, account: bytes, prev: bytes, rep: bytes, bal: int,
                  link: bytes, sig: bytes, work: int):
         assert (isinstance(work, int))
@@ -288,17 +386,26 @@ class block_state:
         self.link = link
         self.signature = sig
         self.work = work
-        self.ancillary = {
-            "next": None,
-            "peers": set(),
-            "type": block_type_enum.not_a_block
-        }
+        self._ancillary = None
+
+    @property
+    def ancillary(self) -> dict:
+        # only a few blocks ever need next/peers/type, create it on first use
+        if self._ancillary is None:
+            self._ancillary = {
+                "next": None,
+                "peers": set(),
+                "type": block_type_enum.not_a_block
+            }
+        return self._ancillary
 
     def get_previous(self) -> bytes:
         return self.previous
 
     def get_next(self) -> bytes:
-        return self.ancillary['next']
+        if self._ancillary is None:
+            return None
+        return self._ancillary['next']
 
     def get_account(self) -> bytes:
         return self.account
@@ -324,27 +431,46 @@ class block_state:
         return hexlify(self.hash())
 
     def hash(self) -> bytes:
-        STATE_BLOCK_HEADER_BYTES = (b'\x00' * 31) + b'\x06'
         data = b"".join([
-            STATE_BLOCK_HEADER_BYTES, self.account, self.previous,
+            self.HASH_PREAMBLE, self.account, self.previous,
             self.representative,
             self.balance.to_bytes(16, "big"), self.link
         ])
         return blake2b(data, digest_size=32).digest()
 
     def serialise(self, include_block_type: bool) -> bytes:
-        data = b''
-        if include_block_type:
-            data += (6).to_bytes(1, "big")
-        data += self.account
-        data += self.previous
-        data += self.representative
-        data += self.balance.to_bytes(16, "big")
-        data += self.link
-        data += self.signature
-
         # Block states proof of work is received and sent in big endian
-        data += self.work.to_bytes(8, "big")
+        account, previous, representative, link, signature = (
+            self.account, self.previous, self.representative, self.link,
+            self.signature)
+        # struct pads or truncates "s" fields, check their lengths first
+        if (len(account) != 32 or len(previous) != 32
+                or len(representative) != 32 or len(link) != 32
+                or len(signature) != 64):
+            sizes = [
+                len(field) for field in (account, previous, representative,
+                                         link, signature)
+            ]
+            raise ValueError(
+                f"Invalid block_state field lengths {sizes} (account, "
+                f"previous, representative, link, signature)")
+        balance = self.balance
+        try:
+            data = self.CODEC.pack(account, previous, representative,
+                                   balance >> 64, balance & self.U64_MASK,
+                                   link, signature, self.work)
+        except struct.error:
+            # struct only packs bytes, memoryview fields are copied
+            try:
+                data = self.CODEC.pack(bytes(account), bytes(previous),
+                                       bytes(representative), balance >> 64,
+                                       balance & self.U64_MASK, bytes(link),
+                                       bytes(signature), self.work)
+            except struct.error as error:
+                raise ValueError(
+                    f"Invalid block_state balance or work: {error}")
+        if include_block_type:
+            return b'\x06' + data
         return data
 
     def is_epoch_v2_block(self) -> bool:
@@ -368,27 +494,22 @@ class block_state:
     @classmethod
     def parse(cls, data: bytes):
         assert (len(data) == block_length_by_type(6))
-        account = data[0:32]
-        prev = data[32:64]
-        rep = data[64:96]
-        bal = int.from_bytes(data[96:112], "big")
-        link = data[112:144]
-        sig = data[144:208]
-        # Block states proof of work is received and sent in big endian
-        work = int.from_bytes(data[208:], "big")
-        return block_state(account, prev, rep, bal, link, sig, work)
+        (account, prev, rep, bal_high, bal_low, link, sig,
+         work) = cls.CODEC.unpack(data)
+        return block_state(account, prev, rep, (bal_high << 64) | bal_low,
+                           link, sig, work)
 
     @classmethod
     def parse_from_json(cls, json_obj: dict):
         assert (json_obj['type'] == 'state')
-        account = account_key(json_obj['account'])
+        account = cached_account_key(json_obj['account'])
         prev = binascii.unhexlify(json_obj['previous'])
-        rep = account_key(json_obj['representative'])
+        rep = cached_account_key(json_obj['representative'])
         bal = int(json_obj['balance'])
         if len(json_obj['link']) == 64:
             link = binascii.unhexlify(json_obj['link'])
         else:
-            link = account_key(json_obj['link'])
+            link = cached_account_key(json_obj['link'])
         sig = binascii.unhexlify(json_obj['signature'])
         work = int.from_bytes(binascii.unhexlify(json_obj['work']), "big")
         return block_state(account, prev, rep, bal, link, sig, work)
@@ -396,12 +517,12 @@ class block_state:
     def to_json(self) -> str:
         jsonblk = {
             'type': 'state',
-            'account': to_account_addr(self.account),
+            'account': cached_to_account_addr(self.account),
             'previous': hexlify(self.previous),
-            'representative': to_account_addr(self.representative),
+            'representative': cached_to_account_addr(self.representative),
             'balance': str(self.balance),
             'link': hexlify(self.link),
-            'link_as_account': to_account_addr(self.link),
+            'link_as_account': cached_to_account_addr(self.link),
             'signature': hexlify(self.signature),
             'work': hexlify(self.work.to_bytes(8, "big"))
         }
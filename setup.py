@@ -14,6 +14,7 @@ setup(name="nanolab",
       include_package_data=True,
       install_requires=["nanomock>=0.0.14",
                         "py_ed25519_blake2b", "sqlalchemy", "requests", "aiohttp", "nanolog_parser"],
+      extras_require={"numpy": ["numpy"]},
       entry_points={
           'console_scripts': [
               'nanolab=nanolab.main:main',
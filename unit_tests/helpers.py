@@ -0,0 +1,52 @@
+import json
+import time
+from nanolab.xnomin.peers import block_state
+
+
+def create_block(round: int, index: int) -> block_state:
+    account = bytes([round + 1]) * 31 + bytes([index])
+    return block_state(account, b"\x00" * 32, account, 10**30 + index,
+                       bytes([index]) * 32, b"\x11" * 64, index)
+
+
+def write_json_corpus(path, rounds=3, blocks_per_round=4):
+    blocks = [[create_block(r, i) for i in range(blocks_per_round)]
+              for r in range(rounds)]
+    corpus = {
+        "s": [{"seed": "00" * 32, "index": 0}],
+        "h": [[b.hash_string() for b in r] for r in blocks],
+        "b": [[json.loads(b.to_json()) for b in r] for r in blocks]
+    }
+    path.write_text(json.dumps(corpus))
+    return blocks
+
+
+def wait_for(condition, timeout=2):
+    start_time = time.time()
+    while not condition() and time.time() - start_time < timeout:
+        time.sleep(0.01)
+    return condition()
+
+
+class FakeRpc:
+    """Node RPC for the publisher's pollers: block_count returns the next
+    of `counts` (the last one repeats), blocks_info reports the hashes in
+    `confirmed` as confirmed and records every request."""
+
+    def __init__(self, counts=(0, ), confirmed=()):
+        self.counts = list(counts)
+        self.confirmed = set(confirmed)
+        self.requests = []
+
+    async def block_count(self):
+        count = self.counts.pop(0) if len(self.counts) > 1 else self.counts[0]
+        return {"count": count, "cemented": count}
+
+    async def blocks_info(self, hashes, include_not_found):
+        self.requests.append(list(hashes))
+        return {
+            "blocks": {
+                h: {"confirmed": "true" if h in self.confirmed else "false"}
+                for h in hashes
+            }
+        }
@@ -0,0 +1,27 @@
+import pytest
+from nanolab.xnomin.acctools import account_key, to_account_addr, cached_account_key, cached_to_account_addr, account_cache_clear, account_cache_stats
+
+ACCOUNT = "nano_31fr1qtbrfnujcspx5xq61uxgjf9j6rzckdj1kdn61y3h53nxr7911dzetk3"
+
+
+def test_account_roundtrip():
+    key = account_key(ACCOUNT)
+
+    assert len(key) == 32
+    assert to_account_addr(key) == ACCOUNT
+    assert cached_to_account_addr(cached_account_key(ACCOUNT)) == ACCOUNT
+
+
+def test_account_cache_counts_hits():
+    account_cache_clear()
+    for _ in range(4):
+        cached_account_key(ACCOUNT)
+
+    stats = account_cache_stats()["account_key"]
+    assert (stats["hits"], stats["misses"], stats["size"]) == (3, 1, 1)
+    assert stats["hit_rate"] == 0.75
+
+
+def test_cached_account_key_rejects_invalid_checksum():
+    with pytest.raises(AssertionError):
+        cached_account_key(ACCOUNT[:-1] + "1")
@@ -0,0 +1,37 @@
+import json
+import pytest
+from nanolab.xnomin.peers import block_state
+from nanolab.publisher.block_corpus import BlockCorpus, convert_json_corpus, is_binary_corpus
+from unit_tests.helpers import write_json_corpus
+
+
+def test_convert_and_read_binary_corpus(tmp_path):
+    json_path = tmp_path / "blocks.json"
+    corpus_path = tmp_path / "blocks.nlb"
+    blocks = write_json_corpus(json_path)
+
+    assert convert_json_corpus(str(json_path), str(corpus_path)) == {
+        "blocks": 12, "rounds": 3}
+    assert is_binary_corpus(str(corpus_path))
+    assert not is_binary_corpus(str(json_path))
+
+    corpus = BlockCorpus(str(corpus_path)).to_dict()
+    assert corpus["s"] == [{"seed": "00" * 32, "index": 0}]
+    assert [len(r) for r in corpus["b"]] == [4, 4, 4]
+    assert bytes(corpus["b"][1][2]) == blocks[1][2].serialise(False)
+    assert corpus["h"][2][3] == blocks[2][3].hash_string()
+
+    subset = corpus["b"][2][1:3]
+    assert len(subset) == 2
+    assert block_state.parse(bytes(subset[0])).hash() == blocks[2][1].hash()
+
+
+def test_convert_rejects_mismatching_hashes(tmp_path):
+    json_path = tmp_path / "blocks.json"
+    write_json_corpus(json_path)
+    corpus = json.loads(json_path.read_text())
+    corpus["h"][1].pop()
+    json_path.write_text(json.dumps(corpus))
+
+    with pytest.raises(ValueError):
+        convert_json_corpus(str(json_path), str(tmp_path / "blocks.nlb"))
@@ -0,0 +1,59 @@
+from nanolab.publisher.block_order import dependency_order, order_block_lists
+from nanolab.xnomin.peers import block_state
+
+ZERO = b"\x00" * 32
+
+
+def block_hash(n: int) -> bytes:
+    return bytes([n + 10]) * 32
+
+
+def create_block(previous: bytes, link: bytes) -> block_state:
+    return block_state(b"\x01" * 32, previous, b"\x02" * 32, 0, link,
+                       b"\x00" * 64, 0)
+
+
+def test_dependency_order_moves_receive_after_send():
+    # 0: open of account A receiving send 2, 1: unrelated, 2: send,
+    # 3: next block of account A
+    blocks = [
+        create_block(ZERO, block_hash(2)),
+        create_block(ZERO, ZERO),
+        create_block(ZERO, b"\x09" * 32),
+        create_block(block_hash(0), ZERO)
+    ]
+    hashes = [block_hash(n).hex().upper() for n in range(4)]
+
+    order, report = dependency_order(hashes, blocks)
+
+    assert list(order) == [1, 2, 0, 3]
+    assert report == {"blocks": 4, "out_of_order": 1, "unresolved": 0}
+
+
+def test_dependency_order_keeps_ordered_corpus():
+    blocks = [create_block(ZERO, ZERO)] + [
+        create_block(block_hash(n), ZERO) for n in range(5)
+    ]
+    hashes = [block_hash(n).hex() for n in range(6)]
+
+    order, report = dependency_order(hashes, blocks)
+
+    assert list(order) == list(range(6))
+    assert report["out_of_order"] == 0
+
+
+def test_dependency_order_json_and_cycles():
+    # json sends link to an account, 0 and 1 depend on each other
+    blocks = [
+        {"previous": block_hash(1).hex(), "link": "nano_1destination"},
+        {"previous": block_hash(0).hex(), "link": "0" * 64},
+        {"previous": "0" * 64, "link": "nano_1destination"},
+    ]
+    block_lists = {"h": [[block_hash(0).hex()], [block_hash(1).hex(),
+                                                 block_hash(2).hex()]],
+                   "b": [blocks[:1], blocks[1:]]}
+
+    ordered = order_block_lists(block_lists)
+
+    assert ordered["b"] == [[blocks[2], blocks[0], blocks[1]]]
+    assert ordered["h"][0][0] == block_hash(2).hex()
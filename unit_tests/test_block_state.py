@@ -0,0 +1,78 @@
+import os
+import pytest
+from hashlib import blake2b
+from nanolab.xnomin.peers import block_state
+
+
+def create_block(balance=(1 << 127) + (1 << 64) + 5, work=0x0123456789abcdef):
+    return block_state(os.urandom(32), os.urandom(32), os.urandom(32),
+                       balance, os.urandom(32), os.urandom(64), work)
+
+
+def expected_bytes(block: block_state) -> bytes:
+    # the layout spelled out field by field
+    return (block.account + block.previous + block.representative +
+            block.balance.to_bytes(16, "big") + block.link + block.signature +
+            block.work.to_bytes(8, "big"))
+
+
+def test_serialise_layout():
+    block = create_block()
+    data = block.serialise(False)
+
+    assert len(data) == 216
+    assert data == expected_bytes(block)
+    assert data[96:104] == ((1 << 63) + 1).to_bytes(8, "big")
+    assert data[104:112] == (5).to_bytes(8, "big")
+    assert data[208:] == bytes.fromhex("0123456789abcdef")
+
+
+def test_serialise_with_block_type():
+    block = create_block()
+    data = block.serialise(True)
+    assert len(data) == 217
+    assert data[0] == 6
+    assert data[1:] == block.serialise(False)
+
+
+@pytest.mark.parametrize("balance", [0, 1, (1 << 64) - 1, 1 << 64,
+                                     (1 << 128) - 1])
+def test_parse_serialise_round_trip(balance):
+    block = create_block(balance=balance)
+    data = block.serialise(False)
+    parsed = block_state.parse(data)
+
+    assert parsed.balance == balance
+    assert (parsed.account, parsed.previous, parsed.representative,
+            parsed.link, parsed.signature, parsed.work) == (
+                block.account, block.previous, block.representative,
+                block.link, block.signature, block.work)
+    assert parsed.serialise(False) == data
+    assert block_state.parse(memoryview(data)).serialise(False) == data
+    assert parsed.hash() == blake2b(
+        (b'\x00' * 31) + b'\x06' + data[:144], digest_size=32).digest()
+
+
+def test_serialise_memoryview_fields():
+    block = create_block()
+    data = block.serialise(False)
+    view = memoryview(data)
+    block.account = view[0:32]
+    block.signature = view[144:208]
+    assert block.serialise(False) == data
+
+
+@pytest.mark.parametrize("field,size", [("account", 31), ("previous", 33),
+                                        ("representative", 0), ("link", 31),
+                                        ("signature", 32)])
+def test_serialise_rejects_wrong_field_length(field, size):
+    block = create_block()
+    setattr(block, field, bytes(size))
+    with pytest.raises(ValueError):
+        block.serialise(False)
+
+
+@pytest.mark.parametrize("balance", [-1, 1 << 128])
+def test_serialise_rejects_balance_out_of_range(balance):
+    with pytest.raises(ValueError):
+        create_block(balance=balance).serialise(False)
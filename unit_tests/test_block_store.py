@@ -0,0 +1,56 @@
+import json
+import pytest
+from nanolab.publisher.block_corpus import convert_json_corpus
+from unit_tests.helpers import write_json_corpus
+
+np = pytest.importorskip("numpy")
+from nanolab.publisher.block_store import BlockStore  # noqa: E402
+
+
+@pytest.fixture(params=["json", "binary"])
+def corpus(request, tmp_path):
+    json_path = tmp_path / "blocks.json"
+    blocks = write_json_corpus(json_path)
+    if request.param == "json":
+        return str(json_path), blocks
+    corpus_path = tmp_path / "blocks.nlb"
+    convert_json_corpus(str(json_path), str(corpus_path))
+    return str(corpus_path), blocks
+
+
+def test_block_store_fields(corpus):
+    path, blocks = corpus
+    store = BlockStore.load(path)
+
+    assert len(store) == 12
+    assert store.records.dtype.itemsize == 216
+    assert bytes(store.records["previous"][5]) == blocks[1][1].previous
+    assert int(store.records["work"][7]) == blocks[1][3].work
+    high, low = store.records["balance"][3]
+    assert (int(high) << 64) | int(low) == blocks[0][3].balance
+    assert list(store.rounds) == [0] * 4 + [1] * 4 + [2] * 4
+
+
+def test_block_store_filters(corpus):
+    path, blocks = corpus
+    store = BlockStore.load(path)
+
+    by_account = store.select(store.account_mask(blocks[2][1].account))
+    assert len(by_account) == 1
+    assert bytes(by_account.hashes[0]).hex().upper() == blocks[2][1].hash_string()
+    assert len(store.select(store.round_mask(1))) == 8
+    assert list(store.select(store.round_mask(0, 2)).rounds) == [0] * 4 + [1] * 4
+
+
+def test_block_store_verifies_hashes(corpus, tmp_path):
+    path, blocks = corpus
+    store = BlockStore.load(path)
+
+    assert bytes(store.compute_hashes()[6]) == blocks[1][2].hash()
+    assert list(store.verify_hashes()) == []
+
+    json_path = tmp_path / "broken.json"
+    data = json.loads((tmp_path / "blocks.json").read_text())
+    data["h"][1][0], data["h"][2][3] = data["h"][2][3], data["h"][1][0]
+    json_path.write_text(json.dumps(data))
+    assert list(BlockStore.load(str(json_path)).verify_hashes()) == [4, 11]
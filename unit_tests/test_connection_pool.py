@@ -0,0 +1,75 @@
+import socket
+from nanolab.publisher.connection_pool import ConnectionPool
+from unit_tests.helpers import wait_for
+
+
+def create_connection(peer="127.0.0.1:7075", frame_messages=False):
+    local, remote = socket.socketpair()
+    return {
+        "socket": local,
+        "peer": peer,
+        "key": (peer, ord('X'), frame_messages),
+        "frame_messages": frame_messages
+    }, remote
+
+
+def test_pool_reuses_released_connection():
+    pool = ConnectionPool()
+    socket_info, remote = create_connection()
+    pool.track(socket_info)
+
+    assert pool.acquire(socket_info['key']) is None
+    pool.release(socket_info)
+    assert pool.size() == 1
+    assert pool.acquire(socket_info['key']) is socket_info
+    assert pool.size() == 0
+
+    pool.release(socket_info)
+    pool.shutdown()
+    remote.close()
+
+
+def test_pool_frames_only_connections_that_ask_for_it():
+    pool = ConnectionPool()
+    plain, plain_remote = create_connection()
+    framed, framed_remote = create_connection(frame_messages=True)
+    pool.track(plain)
+    pool.track(framed)
+
+    assert wait_for(lambda: len(pool.drain.selector.get_map()) == 2)
+    assert pool.drain.streams.get(plain['socket']) is None
+    assert pool.drain.streams[framed['socket']] is not None
+
+    pool.release(plain)
+    pool.release(framed)
+    assert pool.acquire(plain['key']) is plain
+    assert pool.acquire(plain['key']) is None
+    pool.release(plain)
+    pool.shutdown()
+    plain_remote.close()
+    framed_remote.close()
+
+
+def test_pool_discards_closed_connection():
+    pool = ConnectionPool()
+    socket_info, remote = create_connection()
+    pool.track(socket_info)
+    pool.release(socket_info)
+
+    remote.close()
+    assert wait_for(
+        lambda: not pool.drain.is_alive(socket_info['socket']))
+    assert pool.acquire(socket_info['key']) is None
+
+    pool.shutdown()
+    assert socket_info['socket'].fileno() == -1
+
+
+def test_release_after_shutdown_closes_socket():
+    pool = ConnectionPool()
+    socket_info, remote = create_connection()
+    pool.shutdown()
+
+    pool.release(socket_info)
+    assert socket_info['socket'].fileno() == -1
+    remote.close()
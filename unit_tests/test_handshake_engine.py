@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+import socket
+import time
+from unittest.mock import Mock, patch
+from nanolab.publisher.handshake_engine import HandshakeEngine
+from nanolab.xnomin.handshake import node_handshake_id
+from nanolab.xnomin.peers import message_header, message_type, network_id
+
+CTX = {"net_id": network_id(ord('X'))}
+
+
+def keypair():
+    return Mock(sign=lambda cookie: b"\x00" * 64), Mock(
+        to_bytes=lambda: b"\x01" * 32)
+
+
+async def fake_node_reply(writer):
+    # query response: cookie, account and signature
+    hdr = message_header(CTX['net_id'], [21, 21, 20], message_type(10), 3)
+    writer.write(hdr.serialise_header() + b"\x02" * 32 + b"\x03" * 32 +
+                 b"\x04" * 64)
+    await writer.drain()
+
+
+async def fake_node(reader, writer):
+    # answers a node_id_handshake query and keeps the connection open
+    await reader.readexactly(40)
+    await fake_node_reply(writer)
+    await reader.readexactly(104)
+    await reader.read()
+    writer.close()
+
+
+def unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_connect_all_handshakes_many_peers():
+
+    async def run():
+        server = await asyncio.start_server(fake_node, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        engine = HandshakeEngine(CTX, {"handshake_concurrency": 50})
+        start_time = time.perf_counter()
+        sockets = await engine.connect_all([("::ffff:127.0.0.1", port)] *
+                                           120)
+        duration = time.perf_counter() - start_time
+        for s in sockets:
+            s.close()
+        server.close()
+        await server.wait_closed()
+        return engine, sockets, duration
+
+    with patch.object(node_handshake_id, "keypair", side_effect=keypair):
+        engine, sockets, duration = asyncio.run(run())
+
+    assert all(s is not None for s in sockets)
+    assert len(engine.report) == 120
+    assert all(r["error"] is None and r["attempts"] == 1
+               for r in engine.report)
+    assert duration < 1
+
+
+def test_connect_peer_retries_and_reports_failure():
+    port = unused_port()
+    engine = HandshakeEngine(CTX, {
+        "handshake_retries": 2,
+        "handshake_backoff_s": 0.01
+    })
+
+    sockets = asyncio.run(engine.connect_all([("::ffff:127.0.0.1", port)]))
+
+    assert sockets == [None]
+    assert engine.report[0]["attempts"] == 3
+    assert engine.report[0]["error"] is not None
+    assert engine.report[0]["connect_ms"] is None
+
+
+def test_rejects_negative_retries():
+    with pytest.raises(ValueError):
+        HandshakeEngine(CTX, {"handshake_retries": -1})
+
+
+def test_blocking_and_async_exchange_send_the_same_messages():
+
+    def exchange(blocking: bool):
+        sent = []
+        done = asyncio.Event()
+
+        async def node(reader, writer):
+            sent.append(await reader.readexactly(40))
+            await fake_node_reply(writer)
+            sent.append(await reader.readexactly(104))
+            writer.close()
+            done.set()
+
+        async def run():
+            server = await asyncio.start_server(node, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            s = socket.create_connection(("127.0.0.1", port))
+            signing_key, verifying_key = keypair()
+            if blocking:
+                account = await asyncio.to_thread(
+                    node_handshake_id.perform_handshake_exchange, CTX, s,
+                    signing_key, verifying_key)
+            else:
+                s.setblocking(False)
+                account = await node_handshake_id.perform_handshake_exchange_async(
+                    CTX, s, signing_key, verifying_key)
+            await done.wait()
+            s.close()
+            server.close()
+            await server.wait_closed()
+            return account
+
+        return asyncio.run(run()), sent
+
+    blocking_account, blocking_sent = exchange(True)
+    async_account, async_sent = exchange(False)
+
+    assert blocking_account == async_account == b"\x03" * 32
+    # queries differ only by their random cookie
+    assert [m[:8] for m in blocking_sent] == [m[:8] for m in async_sent]
+    assert blocking_sent[0][8:] != async_sent[0][8:]
+    assert blocking_sent[1] == async_sent[1]
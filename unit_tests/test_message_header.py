@@ -0,0 +1,48 @@
+import pytest
+from nanolab.xnomin.peers import (message_header, frozen_message_header,
+                                  message_type, message_type_enum,
+                                  network_id, block_type_enum)
+
+
+def publish_header() -> message_header:
+    hdr = message_header(network_id(ord('X')), [21, 21, 20],
+                         message_type(message_type_enum.publish), 0)
+    hdr.set_block_type(block_type_enum.state)
+    return hdr
+
+
+def test_serialise_header_layout():
+    assert publish_header().serialise_header() == b"RX\x15\x15\x14\x03\x00\x06"
+
+
+def test_frozen_header_matches_mutable_header():
+    hdr = publish_header()
+    frozen = hdr.freeze()
+
+    assert frozen.serialise_header() == hdr.serialise_header()
+    assert frozen == hdr and hdr == frozen
+    assert frozen.payload_length_bytes() == 216
+    assert hash(frozen) == hash(publish_header().freeze())
+    assert len({frozen, publish_header().freeze()}) == 1
+
+    hdr.set_item_count(1)
+    assert frozen != hdr
+    assert frozen != hdr.freeze()
+
+
+def test_frozen_header_is_immutable():
+    frozen = publish_header().freeze()
+    with pytest.raises(AttributeError):
+        frozen.set_block_type(block_type_enum.not_a_block)
+    with pytest.raises(AttributeError):
+        frozen.ext = 0
+    assert frozen.serialise_header() == publish_header().serialise_header()
+
+
+def test_frozen_parse_header_is_shared():
+    data = publish_header().serialise_header()
+    hdr = frozen_message_header.parse_header(data)
+    assert hdr is frozen_message_header.parse_header(bytes(data))
+    assert hdr == message_header.parse_header(data)
+    with pytest.raises(ValueError):
+        frozen_message_header.parse_header(b"Q" + data[1:])
@@ -0,0 +1,81 @@
+import os
+import pytest
+from nanolab.xnomin.message_stream import message_stream
+from nanolab.xnomin.peers import (message_header, message_type,
+                                  message_type_enum, network_id,
+                                  block_type_enum)
+
+
+def header(msg_type: int, ext: int = 0) -> message_header:
+    return message_header(network_id(ord('X')), [21, 21, 20],
+                          message_type(msg_type), ext)
+
+
+def message(hdr: message_header) -> bytes:
+    return hdr.serialise_header() + os.urandom(hdr.payload_length_bytes())
+
+
+def confirm_ack_header(count: int) -> message_header:
+    # V2 count: high nibble in bits 12-15, low nibble in bits 4-7
+    hdr = header(message_type_enum.confirm_ack,
+                 ((count >> 4) << 12) | ((count & 0xf) << 4) | 1)
+    hdr.set_block_type(block_type_enum.not_a_block)
+    return hdr
+
+
+def test_payload_sizes():
+    assert header(message_type_enum.keepalive).payload_length_bytes() == 144
+    assert header(message_type_enum.telemetry_ack,
+                  202).payload_length_bytes() == 202
+    assert header(message_type_enum.node_id_handshake,
+                  3).payload_length_bytes() == 32 + 96
+    assert confirm_ack_header(255).payload_length_bytes() == 104 + 255 * 32
+
+    assert header(message_type_enum.asc_pull_req,
+                  41).payload_length_bytes() == 9 + 41
+    assert header(message_type_enum.asc_pull_ack,
+                  1000).payload_length_bytes() == 9 + 1000
+
+    hdr = header(message_type_enum.confirm_ack)
+    hdr.set_block_type(block_type_enum.not_a_block)
+    hdr.set_item_count(12)
+    assert hdr.payload_length_bytes() == 104 + 12 * 32
+
+
+def test_frames_messages_split_at_any_offset():
+    headers = [
+        header(message_type_enum.keepalive),
+        header(message_type_enum.telemetry_ack, 202),
+        header(message_type_enum.node_id_handshake, 2),
+        confirm_ack_header(17),
+        header(message_type_enum.asc_pull_ack, 300),
+    ]
+    messages = [message(hdr) for hdr in headers]
+    data = b"".join(messages)
+
+    for chunk_size in (1, 7, 8, 100, len(data)):
+        stream = message_stream(buffer_size=64)
+        frames = []
+        for offset in range(0, len(data), chunk_size):
+            frames += [(hdr, bytes(payload)) for hdr, payload in
+                       stream.feed(data[offset:offset + chunk_size])]
+        assert [hdr for hdr, _ in frames] == headers
+        assert [hdr.serialise_header() + payload
+                for hdr, payload in frames] == messages
+        assert stream.buffered() == 0
+
+
+def test_keeps_incomplete_message():
+    data = message(confirm_ack_header(3))
+    stream = message_stream()
+    assert list(stream.feed(data[:-1])) == []
+    assert stream.buffered() == len(data) - 8 - 1
+    frames = list(stream.feed(data[-1:]))
+    assert len(frames) == 1
+    assert bytes(frames[0][1]) == data[8:]
+
+
+def test_rejects_unframeable_bytes():
+    stream = message_stream()
+    with pytest.raises(ValueError):
+        list(stream.feed(b"Q" * 8))
@@ -0,0 +1,374 @@
+import asyncio
+import json
+import random
+import socket
+from unittest.mock import patch
+from nanolab.node_interaction import SerialisedMessages, SocketPublish, create_publish_shards, get_message_range, iter_corpus_rounds, stream_blocks_collect_hashes, stream_blocks_from_disk
+from nanolab.src.json_stream import iter_json_array
+from nanolab.publisher.rate_control import LoadProfile, TokenBucketPacer
+from nanolab.publisher.send_log import IndexedMessages
+from nanolab.xnomin.peers import network_id
+
+
+class FakeBlock:
+
+    def __init__(self, value: int):
+        self.value = value
+
+    def serialise(self, include_block_type: bool) -> bytes:
+        return bytes([self.value]) * 4
+
+
+def create_messages(count=5):
+    return SerialisedMessages.from_blocks(
+        b'HDR', [FakeBlock(i) for i in range(count)])
+
+
+def create_socket_publish(**params) -> SocketPublish:
+    ctx = {"net_id": network_id(ord('X')), "peers": {}}
+    with patch.object(SocketPublish, "get_xnolib_context", return_value=ctx):
+        return SocketPublish({"reuse_connections": False, **params})
+
+
+def test_serialised_messages_records():
+    messages = create_messages()
+
+    assert len(messages) == 5
+    assert bytes(messages[0]) == b'HDR' + b'\x00' * 4
+    assert bytes(messages[-1]) == b'HDR' + b'\x04' * 4
+    assert len(messages.buffer) == 5 * 7
+
+
+def test_serialised_messages_slice_shares_buffer():
+    messages = create_messages()
+    subset = messages[1:3]
+
+    assert len(subset) == 2
+    assert subset.buffer.obj is messages.buffer.obj
+    assert [bytes(m)[3] for m in subset] == [1, 2]
+
+
+def test_serialised_messages_reverse_and_sample():
+    messages = create_messages()
+    messages.reverse()
+    assert [bytes(m)[3] for m in messages] == [4, 3, 2, 1, 0]
+
+    shuffled = random.sample(messages, len(messages))
+    assert sorted(bytes(m)[3] for m in shuffled) == [0, 1, 2, 3, 4]
+
+
+def test_create_publish_shards_split_ranges(tmp_path):
+    ctx = {"peers": {"nl_genesis": {}, "nl_pr1": {}, "nl_pr2": {}, "nl_pr3": {}}}
+    blocks_path = tmp_path / "blocks.json"
+    blocks_path.write_text(json.dumps({
+        "s": [],
+        "h": [[str(i) for i in range(61)], [str(i) for i in range(30)]],
+        "b": [[{}] * 61, [{}] * 30]
+    }))
+    params = {"blocks_path": str(blocks_path), "bps": 100, "processes": 2,
+              "split_skip": True, "subset": {}}
+
+    with patch.object(SocketPublish, "get_xnolib_context", return_value=ctx):
+        shards = create_publish_shards(params)
+
+    # contiguous peers with the ranges a single process would give them
+    assert [s["peers"] for s in shards] == [["nl_pr1"], ["nl_pr2", "nl_pr3"]]
+    assert [s["message_range"] for s in shards] == [[0, 31], [31, 91]]
+    assert all(s["split"] and not s["split_skip"] for s in shards)
+    assert all(s["processes"] == 1 for s in shards)
+    assert params["subset"] == {}
+
+    sp = SocketPublish.__new__(SocketPublish)
+    with patch.object(SocketPublish, "publish",
+                      new=lambda self, socket, msgs: (socket, list(msgs))):
+        single = sp.create_split_tasks(list(ctx["peers"]), list(range(91)),
+                                       skip_first_socket=True)
+        workers = [
+            sp.create_split_tasks(s["peers"],
+                                  list(range(*s["message_range"])))
+            for s in shards
+        ]
+    assert single == [task for tasks in workers for task in tasks]
+
+
+def test_get_message_range_flattens_rounds():
+    blocks = {"b": [[1, 2, 3], [4, 5]], "h": [["a", "b", "c"], ["d", "e"]]}
+
+    assert get_message_range(blocks, 2, 4) == {"b": [[3, 4]], "h": [["c", "d"]]}
+
+
+def test_stream_blocks_from_disk_selects_rounds_and_subset(tmp_path):
+    blocks_path = tmp_path / "blocks.json"
+    corpus = {
+        "s": [],
+        "h": [[f"{r}-{i}" for i in range(5)] for r in range(4)],
+        "b": [[{"round": r, "index": i} for i in range(5)] for r in range(4)]
+    }
+    blocks_path.write_text(json.dumps(corpus))
+    params = {"blocks_path": str(blocks_path), "start_round": 1,
+              "end_round": 3, "subset": {"start_index": 1, "end_index": 4}}
+
+    rounds = list(stream_blocks_from_disk(params))
+    assert [[(b["round"], b["index"]) for b in r] for r in rounds] == [
+        [(1, 1), (1, 2), (1, 3)], [(2, 1), (2, 2), (2, 3)]]
+
+    params["message_range"] = [2, 4]
+    rounds = list(stream_blocks_from_disk(params))
+    assert [[(b["round"], b["index"]) for b in r] for r in rounds] == [
+        [(1, 3)], [(2, 1)]]
+
+
+def test_publish_spreads_messages_across_channels():
+    sp = create_socket_publish(bps=100000)
+    remotes = []
+    for channel in range(2):
+        local, remote = socket.socketpair()
+        local.setblocking(False)
+        sp.sockets.append({"socket": local, "peer": "127.0.0.1:7075",
+                           "channel": channel})
+        remotes.append(remote)
+
+    assert len(sp.peer_sockets()) == 1
+    asyncio.run(sp.publish(sp.peer_sockets()[0], create_messages(5)))
+
+    received = [remote.recv(1024) for remote in remotes]
+    assert received[0] == b"".join(bytes(m) for m in create_messages(5)[0::2])
+    assert received[1] == b"".join(bytes(m) for m in create_messages(5)[1::2])
+    stats = sp.get_channel_stats()
+    assert stats["127.0.0.1:7075#0"]["sent_messages"] == 3
+    assert stats["127.0.0.1:7075#1"]["bytes"] == 2 * 7
+    for socket_info, remote in zip(sp.sockets, remotes):
+        socket_info["socket"].close()
+        remote.close()
+
+
+def test_publish_logs_message_index(tmp_path):
+    sp = create_socket_publish(bps=100000,
+                               batch_size=2,
+                               send_log_path=str(tmp_path / "send.log"))
+    local, remote = socket.socketpair()
+    local.setblocking(False)
+    sp.sockets.append({"socket": local, "peer": "127.0.0.1:7075"})
+
+    messages = IndexedMessages(create_messages(5))
+    messages.reverse()
+    asyncio.run(sp.publish(sp.peer_sockets()[0], messages))
+
+    assert list(sp.send_log.hash_index) == [4, 3, 2, 1, 0]
+    assert remote.recv(1024)[:7] == bytes(create_messages(5)[4])
+    local.close()
+    remote.close()
+
+
+def account_chain_messages():
+    # 40 chains of 5 blocks, interleaved like rounds of a corpus
+    accounts = [bytes([a]) * 32 for a in range(40)]
+    header = b"\x00" * 8
+    blocks = [account + bytes([height]) * 184
+              for height in range(5) for account in accounts]
+    return SerialisedMessages.from_serialised_blocks(header, blocks)
+
+
+def test_split_by_account_keeps_chains_on_one_socket():
+    sp = create_socket_publish(bps=1, split_by_account=True)
+    sockets = [{"peer": f"127.0.0.1:{7075 + i}"} for i in range(3)]
+    sp.sockets = sockets
+    messages = account_chain_messages()
+
+    with patch.object(SocketPublish, "publish_channels",
+                      new=lambda self, channels, subsets: subsets[0]):
+        subsets = sp.create_account_split_tasks(sockets, messages)
+
+    assert sum(len(subset) for subset in subsets) == len(messages)
+    assert all(len(subset) > 0 for subset in subsets)
+    for subset in subsets:
+        chains = {}
+        for message in subset:
+            chains.setdefault(bytes(message[8:40]), []).append(message[40])
+        assert all(heights == list(range(5)) for heights in chains.values())
+    owners = [{bytes(m[8:40]) for m in subset} for subset in subsets]
+    assert not owners[0] & owners[1] and not owners[1] & owners[2]
+
+
+def test_split_by_account_keeps_chains_on_one_channel():
+    sp = create_socket_publish(bps=1,
+                               split_by_account=True,
+                               channels_per_peer=3)
+    sp.sockets = [{"peer": f"127.0.0.1:{7075 + i}", "channel": c}
+                  for i in range(2) for c in range(3)]
+    messages = account_chain_messages()
+
+    with patch.object(SocketPublish, "publish_channels",
+                      new=lambda self, channels, subsets: subsets):
+        tasks = sp.create_account_split_tasks(sp.peer_sockets(), messages)
+
+    subsets = [subset for task in tasks for subset in task]
+    assert len(subsets) == 6
+    assert sum(len(subset) for subset in subsets) == len(messages)
+    owners = [{bytes(m[8:40]) for m in subset} for subset in subsets]
+    assert sum(len(o) for o in owners) == 40
+    for subset in subsets:
+        assert len(subset) > 0
+        chains = {}
+        for message in subset:
+            chains.setdefault(bytes(message[8:40]), []).append(message[40])
+        assert all(heights == list(range(5)) for heights in chains.values())
+
+
+def test_create_publish_shards_split_by_account():
+    ctx = {"peers": {"nl_pr1": {}, "nl_pr2": {}, "nl_pr3": {}}}
+    params = {"blocks_path": "blocks.json", "bps": 100, "processes": 2,
+              "split_by_account": True}
+
+    with patch.object(SocketPublish, "get_xnolib_context", return_value=ctx):
+        shards = create_publish_shards(params)
+
+    assert [s["account_slots"] for s in shards] == [[0], [1, 2]]
+    assert all(s["account_slot_count"] == 3 for s in shards)
+    assert all("message_range" not in s for s in shards)
+
+
+def test_shuffle_tasks_use_seeded_permutation():
+    sp = create_socket_publish(bps=1, shuffle=True, shuffle_seed=3)
+    sockets = [{"peer": "127.0.0.1:7075"}, {"peer": "127.0.0.1:7076"}]
+    messages = create_messages(50)
+
+    with patch.object(SocketPublish, "publish",
+                      new=lambda self, socket, msgs: msgs):
+        first = sp.create_shuffle_tasks(sockets, messages)
+        again = sp.create_shuffle_tasks(sockets, messages)
+
+    orders = [[bytes(m)[3] for m in subset] for subset in first]
+    assert sorted(orders[0]) == sorted(orders[1]) == list(range(50))
+    assert orders[0] != orders[1]
+    assert orders[0] == [bytes(m)[3] for m in again[0]]
+
+
+class FakeClock:
+    """perf_counter replacement, only advanced by the pacer's sleeps"""
+
+    def __init__(self, tick_s: float):
+        self.now = 0.0
+        self.tick_s = tick_s
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.now += max(delay, self.tick_s)
+
+
+def publish_batches(batch_size: int, message_count: int, tick_s: float):
+    sp = create_socket_publish(bps=1024, batch_size=batch_size)
+    local, remote = socket.socketpair()
+    local.setblocking(False)
+    socket_info = {"socket": local, "peer": "127.0.0.1:7075"}
+    sp.sockets.append(socket_info)
+    clock = FakeClock(tick_s)
+    sp.pacers[socket_info["peer"]] = TokenBucketPacer(LoadProfile(1024),
+                                                      clock=clock)
+
+    messages = create_messages(message_count)
+    with patch("nanolab.publisher.rate_control.asyncio.sleep", clock.sleep):
+        asyncio.run(sp.publish(socket_info, messages))
+
+    received = remote.recv(65536)
+    local.close()
+    remote.close()
+    assert received == b"".join(bytes(m) for m in messages)
+    return sp, list(sp.batch_stats["127.0.0.1:7075#0"])
+
+
+def test_publish_batches_coalesces_due_messages_per_tick():
+    # 1/256 s ticks at 1024 bps: 4 messages are due per tick
+    sp, tick_bytes = publish_batches(batch_size=10, message_count=21,
+                                     tick_s=1 / 256)
+
+    assert tick_bytes == [7] + [4 * 7] * 5
+    assert sp.sent_messages == 21
+    assert sp.get_channel_stats()["127.0.0.1:7075#0"]["bytes"] == 21 * 7
+
+
+def test_publish_batches_caps_batch_size():
+    sp, tick_bytes = publish_batches(batch_size=3, message_count=30,
+                                     tick_s=1 / 64)
+
+    assert max(tick_bytes) == 3 * 7
+    assert sum(tick_bytes) == 30 * 7
+    assert sp.sent_messages == 30
+
+
+class PartialSendSocket:
+
+    def __init__(self, accepted: int):
+        self.accepted = accepted
+        self.data = []
+
+    def sendmsg(self, buffers):
+        if not self.accepted:
+            raise BlockingIOError()
+        self.data.append(b"".join(buffers)[:self.accepted])
+        return self.accepted
+
+    def sendall(self, data):
+        assert isinstance(data, memoryview)
+        self.data.append(bytes(data))
+
+
+def test_send_batch_sends_remainder_without_joining():
+    sp = create_socket_publish(bps=1000, transport="blocking")
+    buffers = [b"a" * 4, memoryview(b"b" * 4), b"c" * 4]
+
+    for accepted, sends in ((6, [b"aaaabb", b"bb", b"cccc"]),
+                            (8, [b"aaaabbbb", b"cccc"]),
+                            (0, [b"aaaa", b"bbbb", b"cccc"])):
+        sock = PartialSendSocket(accepted)
+        assert asyncio.run(sp.send_batch(sock, buffers)) == 12
+        assert sock.data == sends
+
+
+def test_stream_blocks_collect_hashes_reads_corpus_once(tmp_path):
+    blocks_path = tmp_path / "blocks.json"
+    corpus = {
+        "s": [],
+        "h": [[f"{r}-{i}" for i in range(5)] for r in range(4)],
+        "b": [[{"round": r, "index": i} for i in range(5)] for r in range(4)]
+    }
+    blocks_path.write_text(json.dumps(corpus))
+    params = {"blocks_path": str(blocks_path), "start_round": 1,
+              "end_round": 3, "subset": {"start_index": 1, "end_index": 4},
+              "message_range": [2, 5]}
+    expected = [[(1, 3)], [(2, 1), (2, 2)]]
+
+    hashes = []
+    with patch("nanolab.node_interaction.iter_json_array",
+               wraps=iter_json_array) as reader:
+        rounds = list(stream_blocks_collect_hashes(params, hashes))
+    assert reader.call_count == 1
+    assert [[(b["round"], b["index"]) for b in r] for r in rounds] == expected
+    assert hashes == ["1-3", "2-1", "2-2"]
+
+    # hashes stored after the blocks still line up
+    corpus = {"b": corpus["b"], "h": corpus["h"]}
+    blocks_path.write_text(json.dumps(corpus))
+    hashes = []
+    rounds = list(stream_blocks_collect_hashes(params, hashes))
+    assert [[(b["round"], b["index"]) for b in r] for r in rounds] == expected
+    assert hashes == ["1-3", "2-1", "2-2"]
+
+
+def test_iter_corpus_rounds_keeps_only_selected_hashes(tmp_path):
+    blocks_path = tmp_path / "blocks.json"
+    corpus = {
+        "h": [[f"{r}-{i}" for i in range(2)] for r in range(4)],
+        "b": [[{"round": r, "index": i} for i in range(2)] for r in range(4)]
+    }
+    blocks_path.write_text(json.dumps(corpus))
+
+    rounds = iter_corpus_rounds(str(blocks_path), ("h", "b"), range(1, 3))
+    _, first_blocks = next(rounds)
+    # every hash round was read before the first block round
+    assert first_blocks == corpus["b"][0]
+    assert [hash_list for hash_list, _ in rounds] == [
+        corpus["h"][1], corpus["h"][2], None
+    ]
@@ -0,0 +1,21 @@
+from nanolab.src.permutation import IndexPermutation
+
+
+def test_permutation_covers_every_index():
+    for size in (1, 2, 3, 17, 1000, 4099):
+        assert sorted(IndexPermutation(size, 7)) == list(range(size))
+
+
+def test_permutation_is_reproducible_from_seed():
+    assert list(IndexPermutation(100, "a")) == list(IndexPermutation(100, "a"))
+    assert list(IndexPermutation(100, "a")) != list(IndexPermutation(100, "b"))
+    assert list(IndexPermutation(100, "a")) != list(range(100))
+
+
+def test_permutation_slices_lazily():
+    permutation = IndexPermutation(10**9, 1)
+
+    assert len(permutation) == 10**9
+    tail = permutation[-3:]
+    assert list(tail) == [permutation[-3], permutation[-2], permutation[-1]]
+    assert permutation[::-1][0] == permutation[10**9 - 1]
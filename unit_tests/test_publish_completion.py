@@ -0,0 +1,85 @@
+import asyncio
+import socket
+import threading
+import time
+from nanolab.publisher.publish_completion import PublishCompletion, unsent_bytes
+from unit_tests.helpers import FakeRpc
+
+
+def completion(mode, timeout_s=1):
+    return PublishCompletion({
+        "completion": mode,
+        "completion_timeout_s": timeout_s,
+        "completion_interval_s": 0.01
+    })
+
+
+def test_unsent_bytes_counts_unread_data():
+    local, remote = socket.socketpair()
+    local.sendall(b"x" * 1000)
+    assert unsent_bytes(local) > 0
+    remote.recv(4096)
+    assert unsent_bytes(local) == 0
+    local.close()
+    remote.close()
+
+
+def test_send_queue_waits_until_drained():
+    local, remote = socket.socketpair()
+    local.sendall(b"x" * 1000)
+    timer = threading.Timer(0.1, remote.recv, args=(4096, ))
+    timer.start()
+
+    start_time = time.perf_counter()
+    done = asyncio.run(
+        completion("send_queue").wait([{"socket": local}], 0))
+
+    assert done is True
+    assert time.perf_counter() - start_time >= 0.1
+    timer.join()
+    local.close()
+    remote.close()
+
+
+def test_send_queue_timeout():
+    local, remote = socket.socketpair()
+    local.sendall(b"x" * 1000)
+
+    start_time = time.perf_counter()
+    done = asyncio.run(
+        completion("send_queue", timeout_s=0.05).wait([{"socket": local}], 0))
+
+    assert done is False
+    assert time.perf_counter() - start_time >= 0.05
+    assert unsent_bytes(local) > 0
+    local.close()
+    remote.close()
+
+
+def test_block_count_waits_for_published_blocks():
+    local, remote = socket.socketpair()
+    publish_completion = completion("block_count")
+    publish_completion.nano_rpc = FakeRpc([100, 104, 108, 110])
+    publish_completion.start_block_count = 100
+
+    done = asyncio.run(publish_completion.wait([{"socket": local}], 10))
+
+    assert done is True
+    assert publish_completion.nano_rpc.counts == [110]
+    local.close()
+    remote.close()
+
+
+def test_block_count_timeout():
+    publish_completion = completion("block_count", timeout_s=0.05)
+    publish_completion.nano_rpc = FakeRpc([103])
+    publish_completion.start_block_count = 100
+
+    assert asyncio.run(publish_completion.wait([], 10)) is False
+
+
+def test_sleep_waits_timeout():
+    start_time = time.perf_counter()
+    done = asyncio.run(completion("sleep", timeout_s=0.05).wait([], 10))
+    assert done is True
+    assert time.perf_counter() - start_time >= 0.05
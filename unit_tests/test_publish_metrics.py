@@ -0,0 +1,35 @@
+from nanolab.publisher.publish_metrics import PublishMetrics
+
+MS = 1_000_000
+
+
+def test_metrics_per_peer():
+    metrics = PublishMetrics(interval_s=1)
+    metrics.start(0)
+    # 3 sends 20us apart in the first second, 1 send in the third second
+    for start_ns in (0, 20_000, 40_000):
+        metrics.record_send("peer1", start_ns, start_ns + 5_000, 1, 200)
+    metrics.record_send("peer1", 2500 * MS, 2500 * MS + 1 * MS, 2, 400)
+    metrics.record_error("peer2", 3)
+
+    stats = metrics.to_dict(duration_s=4)
+    peer1 = stats["peer1"]
+    assert peer1["sent_messages"] == 5
+    assert peer1["bytes_sent"] == 1000
+    assert peer1["bps"] == 1.25
+    assert peer1["bps_over_time"] == [3, 0, 2]
+    assert peer1["blocked_s"] == (3 * 5_000 + 1 * MS) / 1e9
+    assert peer1["interval_histogram"]["<=50us"] == 2
+    assert peer1["interval_histogram"][">1000000us"] == 1
+    assert metrics.peers["peer1"].interval_percentile(50) == "<=50us"
+    assert stats["peer2"]["errors"] == 3
+    assert stats["peer2"]["sent_messages"] == 0
+
+
+def test_metrics_start_at_first_send():
+    metrics = PublishMetrics(interval_s=0.5)
+    metrics.record_send("peer1", 10_000 * MS, 10_000 * MS, 1, 200)
+    metrics.record_send("peer1", 10_600 * MS, 10_600 * MS, 1, 200)
+
+    assert metrics.peers["peer1"].bps_over_time() == [2, 2]
+    metrics.print_summary(duration_s=1)
@@ -0,0 +1,12 @@
+from unittest.mock import patch
+from nanolab.pycmd import NodeInteraction
+
+
+def test_publish_blocks_returns_stats():
+    stats = [{"sent_messages": 3}, {"sent_messages": 4}]
+
+    async def xnolib_publish(params):
+        return stats
+
+    with patch("nanolab.node_interaction.xnolib_publish", xnolib_publish):
+        assert NodeInteraction().publish_blocks({"processes": 2}) is stats
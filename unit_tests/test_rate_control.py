@@ -0,0 +1,70 @@
+import pytest
+from nanolab.publisher.rate_control import LoadProfile, TokenBucketPacer
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_load_profile_phases_then_default():
+    profile = LoadProfile(100, [
+        {"type": "ramp", "start_bps": 0, "end_bps": 1000, "duration_s": 10},
+        {"type": "step", "start_bps": 100, "step_bps": 100, "step_s": 5, "duration_s": 20},
+        {"type": "burst", "bps": 500, "burst_s": 1, "idle_s": 1, "duration_s": 10},
+        {"type": "sine", "bps": 200, "amplitude_bps": 100, "period_s": 4, "duration_s": 4},
+    ])
+
+    assert profile.rate_at(5) == 500
+    assert profile.rate_at(10) == 100
+    assert profile.rate_at(26) == 400
+    assert profile.rate_at(30.5) == 500
+    assert profile.rate_at(31.5) == 0
+    assert profile.rate_at(41) == pytest.approx(300)
+    assert profile.rate_at(44) == 100
+
+
+def test_invalid_load_phase():
+    with pytest.raises(ValueError):
+        LoadProfile(100, [{"type": "unknown", "duration_s": 1}])
+
+
+def test_pacer_compensates_oversleep():
+    clock = FakeClock()
+    pacer = TokenBucketPacer(LoadProfile(1000), clock=clock)
+
+    assert pacer.delay() == 0
+    pacer.consume()
+    assert pacer.delay() == pytest.approx(0.001)
+
+    # overslept by 10ms: the missed sends are due immediately
+    clock.now = 0.011
+    assert pacer.available() == 11
+
+
+def test_pacer_keeps_oversleep_at_low_rates():
+    clock = FakeClock()
+    pacer = TokenBucketPacer(LoadProfile(10), clock=clock)
+
+    for _ in range(1000):
+        delay = pacer.delay()
+        while delay > 0:
+            # every sleep overshoots by 2ms of scheduler jitter
+            clock.now += delay + 0.002
+            delay = pacer.delay()
+        pacer.consume()
+
+    assert 999 / clock.now == pytest.approx(10, rel=0.001)
+
+
+def test_pacer_caps_catch_up_burst():
+    clock = FakeClock()
+    pacer = TokenBucketPacer(LoadProfile(1000), capacity_s=0.1, clock=clock)
+    pacer.start()
+
+    clock.now = 5
+    assert pacer.available() == 100
@@ -0,0 +1,158 @@
+import socket
+from nanolab.publisher.receive_drain import ReceiveDrain
+from nanolab.xnomin.peers import (message_header, message_type,
+                                  message_type_enum, network_id)
+from unit_tests.helpers import wait_for
+
+
+def test_receive_drain_counts_bytes_per_peer():
+    pairs = [socket.socketpair() for _ in range(3)]
+    sockets = [{"socket": local, "peer": f"peer{i}"}
+               for i, (local, _) in enumerate(pairs)]
+    received = []
+    drain = ReceiveDrain(sockets,
+                         on_data=lambda peer, data: received.append(
+                             (peer, bytes(data))))
+    drain.start()
+
+    for i, (_, remote) in enumerate(pairs):
+        remote.sendall(b"x" * (i + 1) * 100)
+
+    assert wait_for(lambda: sum(drain.bytes_received.values()) == 600)
+    assert drain.bytes_received == {"peer0": 100, "peer1": 200, "peer2": 300}
+    assert sum(len(data) for _, data in received) == 600
+
+    drain.stop()
+    for local, remote in pairs:
+        local.close()
+        remote.close()
+
+
+def test_receive_drain_unregisters_closed_socket():
+    local, remote = socket.socketpair()
+    drain = ReceiveDrain([{"socket": local, "peer": "peer"}])
+    drain.start()
+    assert drain.is_alive(local)
+
+    remote.close()
+
+    assert wait_for(lambda: not drain.selector.get_map())
+    assert not drain.is_alive(local)
+    drain.stop()
+    local.close()
+
+
+def test_receive_drain_frames_messages():
+    local, remote = socket.socketpair()
+    hdr = message_header(network_id(ord('X')), [21, 21, 20],
+                         message_type(message_type_enum.keepalive), 0)
+    received = []
+    drain = ReceiveDrain([{"socket": local, "peer": "peer"}],
+                         on_message=lambda peer, hdr, payload: received.append(
+                             (peer, hdr, bytes(payload))))
+    drain.start()
+
+    keepalive = hdr.serialise_header() + bytes(144)
+    remote.sendall(keepalive * 2 + keepalive[:20])
+    remote.sendall(keepalive[20:])
+
+    assert wait_for(lambda: len(received) == 3)
+    assert all(peer == "peer" and msg_hdr == hdr and payload == bytes(144)
+               for peer, msg_hdr, payload in received)
+
+    # once framing failed the socket's bytes are only counted
+    remote.sendall(b"Q" * 8)
+    assert wait_for(lambda: drain.parse_errors == 1)
+    remote.sendall(keepalive)
+    assert wait_for(
+        lambda: drain.bytes_received["peer"] == 4 * len(keepalive) + 8)
+    assert len(received) == 3 and drain.parse_errors == 1
+
+    drain.stop()
+    local.close()
+    remote.close()
+
+
+def test_receive_drain_stops_framing_unknown_block_type():
+    pairs = [socket.socketpair() for _ in range(2)]
+    sockets = [{"socket": local, "peer": peer, "frame_messages": True}
+               for (local, _), peer in zip(pairs, ["A", "B"])]
+    drain = ReceiveDrain(sockets)
+    drain.start()
+
+    hdr = message_header(network_id(ord('X')), [21, 21, 20],
+                         message_type(message_type_enum.publish), 0)
+    hdr.set_block_type(15)
+    pairs[0][1].sendall(hdr.serialise_header() + bytes(16))
+    assert wait_for(lambda: drain.parse_errors == 1)
+
+    # the drain thread keeps reading every socket
+    pairs[1][1].sendall(b"x" * 100)
+    assert wait_for(lambda: drain.bytes_received["B"] == 100)
+    assert drain.thread.is_alive()
+    assert drain.streams[sockets[0]["socket"]] is None
+
+    drain.stop()
+    for local, remote in pairs:
+        local.close()
+        remote.close()
+
+
+def test_receive_drain_calls_back_per_socket():
+    pairs = [socket.socketpair() for _ in range(2)]
+    sockets = [{"socket": local, "peer": "peer"} for local, _ in pairs]
+    hdr = message_header(network_id(ord('X')), [21, 21, 20],
+                         message_type(message_type_enum.keepalive), 0)
+    keepalive = hdr.serialise_header() + bytes(144)
+    received = {0: [], 1: []}
+    drain = ReceiveDrain(sockets, frame_messages=True)
+    drain.start()
+
+    # two publishers sharing the drain, each with its own socket
+    for i in range(2):
+        drain.set_on_message([sockets[i]],
+                             lambda peer, hdr, payload, i=i: received[i].
+                             append(peer))
+    for _, remote in pairs:
+        remote.sendall(keepalive)
+    assert wait_for(lambda: len(received[0]) == len(received[1]) == 1)
+
+    # the first one finishing doesn't stop the other's callback
+    drain.set_on_message([sockets[0]], None)
+    for _, remote in pairs:
+        remote.sendall(keepalive * 2)
+    assert wait_for(lambda: len(received[1]) == 3)
+    assert wait_for(lambda: drain.bytes_received["peer"] == 6 * len(keepalive))
+    assert len(received[0]) == 1
+    assert [drain.socket_bytes[s["socket"]] for s in sockets] == [
+        3 * len(keepalive)
+    ] * 2
+
+    drain.stop()
+    for local, remote in pairs:
+        local.close()
+        remote.close()
+
+
+def test_receive_drain_frames_from_registration():
+    local, remote = socket.socketpair()
+    hdr = message_header(network_id(ord('X')), [21, 21, 20],
+                         message_type(message_type_enum.keepalive), 0)
+    keepalive = hdr.serialise_header() + bytes(144)
+    received = []
+    drain = ReceiveDrain([{"socket": local, "peer": "peer"}],
+                         frame_messages=True)
+    drain.start()
+
+    # traffic before on_message is set is framed, but not handed out
+    remote.sendall(keepalive + keepalive[:50])
+    assert wait_for(lambda: drain.bytes_received["peer"] == 202)
+    drain.on_message = lambda peer, hdr, payload: received.append(peer)
+    remote.sendall(keepalive[50:] + keepalive)
+
+    assert wait_for(lambda: len(received) == 2)
+    assert drain.parse_errors == 0
+
+    drain.stop()
+    local.close()
+    remote.close()
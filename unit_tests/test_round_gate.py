@@ -0,0 +1,32 @@
+import asyncio
+import time
+from nanolab.publisher.round_gate import RoundGate
+from unit_tests.helpers import FakeRpc
+
+
+def test_round_gate_waits_for_cemented_round():
+    gate = RoundGate({"round_interval_s": 0, "round_timeout_s": 5})
+    gate.nano_rpc = FakeRpc([100, 104, 108, 110, 115])
+    gate.target_cemented = 100
+
+    async def run():
+        now = time.perf_counter()
+        first = await gate.wait(10, now, now)
+        second = await gate.wait(5, now, now)
+        return first, second
+
+    assert asyncio.run(run()) == (True, True)
+    assert [r["blocks"] for r in gate.rounds] == [10, 5]
+    assert not any(r["timeout"] for r in gate.rounds)
+    assert gate.target_cemented == 115
+
+
+def test_round_gate_timeout_rebases_target():
+    gate = RoundGate({"round_interval_s": 0.01, "round_timeout_s": 0.05})
+    gate.nano_rpc = FakeRpc([3])
+    gate.target_cemented = 0
+
+    now = time.perf_counter()
+    assert asyncio.run(gate.wait(10, now, now)) is False
+    assert gate.rounds[0]["timeout"]
+    assert gate.target_cemented == 3
@@ -0,0 +1,110 @@
+import asyncio
+import random
+from nanolab.publisher.send_log import SendLog, IndexedMessages, ConfirmationTracker, confirmation_latency
+from nanolab.publisher.confirmation_stats import ConfirmationCalculator, percentile
+from unit_tests.helpers import FakeRpc
+
+HASHES = ["%064X" % i for i in range(4)]
+
+
+def create_send_log():
+    send_log = SendLog()
+    send_log.anchor_wall_ns = 1_000_000_000_000
+    send_log.anchor_monotonic_ns = 5_000_000_000
+    # every block is sent to two peers, the first send counts
+    for index in range(4):
+        send_log.record(index, "127.0.0.1:7075", 5_000_000_000 + index * 1000)
+        send_log.record(index, "127.0.0.1:7076", 6_000_000_000)
+    return send_log
+
+
+def test_send_log_round_trip(tmp_path):
+    path = str(tmp_path / "send.log")
+    create_send_log().save(path, HASHES)
+
+    send_log = SendLog.load(path)
+    assert len(send_log) == 8
+    assert list(send_log.hashes) == HASHES
+    assert list(send_log.peers) == ["127.0.0.1:7075", "127.0.0.1:7076"]
+    assert list(send_log.peer_index[:2]) == [0, 1]
+    assert send_log.wall_ns(send_log.send_ns[2]) == 1_000_000_001_000
+
+
+def test_confirmation_latency_uses_first_send(tmp_path):
+    path = str(tmp_path / "send.log")
+    create_send_log().save(path, HASHES)
+    confirmed_at = {
+        HASHES[0]: 1_000_500_000_000,
+        HASHES[1]: 1_001_000_001_000,
+        HASHES[2]: 1_000_250_002_000
+    }
+
+    stats = confirmation_latency([SendLog.load(path)], confirmed_at)
+
+    assert stats["sent_blocks"] == 4
+    assert stats["confs"] == 3
+    assert stats["unconfirmed"] == 1
+    assert stats["min_conf_s"] == 0.25
+    assert stats["perc_50_s"] == 0.5
+    assert stats["max_conf_s"] == 1.0
+
+
+def test_indexed_messages_keep_index():
+    messages = IndexedMessages(["a", "b", "c", "d"], base=10)
+
+    assert list(messages[1::2]) == [(11, "b"), (13, "d")]
+    messages.reverse()
+    assert messages[0] == (13, "d")
+    assert sorted(random.sample(messages, 4)) == [(10, "a"), (11, "b"),
+                                                  (12, "c"), (13, "d")]
+
+
+def test_latency_and_confirmation_tables_share_percentiles():
+    data = [0.4, 0.1, 0.3, 0.2]
+    calculator = ConfirmationCalculator(10)
+
+    assert [percentile(sorted(data), p) for p in (25, 50, 75, 99, 100)] == [
+        0.1, 0.2, 0.3, 0.4, 0.4
+    ]
+    assert [calculator._percentile(data, p) for p in (25, 50, 75, 100)] == [
+        0.1, 0.2, 0.3, 0.4
+    ]
+
+
+def test_confirmation_tracker_polls_only_sent_hashes():
+    tracker = ConfirmationTracker({})
+    tracker.nano_rpc = FakeRpc(confirmed={HASHES[0]})
+    tracker.pending = dict.fromkeys(HASHES)
+    send_log = SendLog()
+    hashes = []
+    tracker.follow(send_log, hashes)
+
+    assert asyncio.run(tracker.poll()) == 0
+    hashes.extend(h.lower() for h in HASHES[:2])
+    send_log.record(0, "peer", 1)
+    send_log.record(1, "peer", 2)
+    send_log.record(0, "peer2", 3)
+
+    assert asyncio.run(tracker.poll()) == 1
+    assert tracker.nano_rpc.requests == [HASHES[:2]]
+    assert set(tracker.confirmed_at) == {HASHES[0]}
+    assert list(tracker.sent) == [HASHES[1]]
+
+
+def test_confirmation_tracker_caps_request_rate():
+    tracker = ConfirmationTracker({
+        "confirmation_interval_s": 0,
+        "confirmation_rps": 1000
+    })
+    tracker.BATCH_SIZE = 2
+    tracker.nano_rpc = FakeRpc()
+    tracker.pending = dict.fromkeys(HASHES)
+
+    async def run():
+        task = asyncio.create_task(tracker.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    # 2 requests per poll, each poll waits 2 ms
+    assert 10 <= len(tracker.nano_rpc.requests) <= 60
@@ -0,0 +1,75 @@
+import asyncio
+import binascii
+from nanolab.publisher.vote_observer import VoteObserver
+from nanolab.xnomin.acctools import to_account_addr
+from nanolab.xnomin.peers import (message_header, message_type,
+                                  message_type_enum, network_id,
+                                  block_type_enum)
+
+HASHES = [bytes([n]) * 32 for n in range(1, 5)]
+REPS = [bytes([0xa0 + n]) * 32 for n in range(3)]
+
+
+def confirm_ack(rep: bytes, hashes, final: bool = True):
+    hdr = message_header(network_id(ord('X')), [21, 21, 20],
+                         message_type(message_type_enum.confirm_ack), 0)
+    hdr.set_block_type(block_type_enum.not_a_block)
+    hdr.set_item_count(len(hashes))
+    timestamp = b"\xff" * 8 if final else (1).to_bytes(8, "little")
+    payload = rep + bytes(64) + timestamp + b"".join(hashes)
+    assert hdr.payload_length_bytes() == len(payload)
+    return hdr, memoryview(payload)
+
+
+def observer(**params):
+    vote_observer = VoteObserver({"vote_interval_s": 0.01, **params})
+    vote_observer.start(binascii.hexlify(h).decode() for h in HASHES)
+    return vote_observer
+
+
+def test_records_first_vote_of_published_hashes():
+    vote_observer = observer()
+    vote_observer.on_message("peer", *confirm_ack(REPS[0], HASHES[:2]))
+    first_ns = vote_observer.first_vote_ns[0]
+    vote_observer.on_message(
+        "peer", *confirm_ack(REPS[1], [HASHES[0], bytes(32), HASHES[2]]))
+
+    assert vote_observer.first_vote_ns[0] == first_ns
+    assert [bool(ns) for ns in vote_observer.first_vote_ns] == [
+        True, True, True, False
+    ]
+    assert set(vote_observer.voted_at()) == {
+        binascii.hexlify(h).decode().upper() for h in HASHES[:3]
+    }
+    assert vote_observer.to_dict() == {
+        "votes": 2,
+        "blocks": 4,
+        "first_vote": 3,
+        "quorum": 0
+    }
+
+
+def test_quorum_counts_final_votes_by_weight():
+    weights = {to_account_addr(rep): 40 for rep in REPS}
+    vote_observer = observer(vote_weights=weights, vote_quorum=80)
+
+    vote_observer.on_message("peer", *confirm_ack(REPS[0], HASHES))
+    vote_observer.on_message("peer", *confirm_ack(REPS[0], HASHES))
+    vote_observer.on_message("peer",
+                             *confirm_ack(REPS[1], HASHES, final=False))
+    assert not any(vote_observer.quorum_ns)
+
+    vote_observer.on_message("peer", *confirm_ack(REPS[2], HASHES[1:]))
+    assert [bool(ns) for ns in vote_observer.quorum_ns] == [
+        False, True, True, True
+    ]
+    assert len(vote_observer.voted_at(quorum=True)) == 3
+    assert vote_observer.to_dict()["quorum"] == 3
+
+
+def test_wait_returns_once_every_block_was_voted():
+    vote_observer = observer(vote_timeout_s=0.05)
+    assert asyncio.run(vote_observer.wait()) is False
+
+    vote_observer.on_message("peer", *confirm_ack(REPS[0], HASHES))
+    assert asyncio.run(vote_observer.wait()) is True